@@ -1,21 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 import io
-import google.generativeai as genai
 import os
+import glob
+import hashlib
+import inspect
+import joblib
+import logging
+from functools import lru_cache
 from ml_model import RatioOptimizer
 from optimization import optimize_teacher_allocation
-from visualization import (
-    create_current_vs_optimal_chart,
-    create_allocation_chart,
-    create_heatmap,
-    create_classroom_balance_chart,
-    create_recommendation_impact_chart,
-    create_alternate_recommendation_chart
-)
 from data_management import (
     ensure_scenarios_dir,
     save_scenario,
@@ -25,7 +20,8 @@ from data_management import (
     export_scenario,
     import_scenario
 )
-from report_generation import generate_report
+
+logger = logging.getLogger(__name__)
 
 # Set page configuration
 st.set_page_config(
@@ -35,13 +31,186 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+MODEL_CACHE_DIR = ".model_cache"
+
+def model_cache_path():
+    """
+    Path of the on-disk model cache, keyed by a hash of the ml_model source so
+    that any change to the model or its training data invalidates it.
+    """
+    source = inspect.getsource(inspect.getmodule(RatioOptimizer))
+    key = hashlib.sha256(source.encode()).hexdigest()[:16]
+    return os.path.join(MODEL_CACHE_DIR, f"ratio_optimizer_{key}.pkl")
+
+@st.cache_resource
+def get_model():
+    """
+    Load the trained ML model, training and persisting it on first use.
+
+    The model is shared across all sessions of this process and stored on disk
+    so that new processes can skip retraining.
+    """
+    cache_path = model_cache_path()
+    try:
+        return joblib.load(cache_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Unpickling can fail in many ways, e.g. after a library upgrade;
+        # the model is simply retrained
+        logger.warning("Ignoring unreadable model cache %s: %s", cache_path, e)
+    
+    model = RatioOptimizer()
+    model.train()
+    try:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        # Remove models cached for older versions of the source
+        for stale_path in glob.glob(os.path.join(MODEL_CACHE_DIR, "ratio_optimizer_*.pkl")):
+            os.remove(stale_path)
+        joblib.dump(model, cache_path, compress=3)
+    except OSError as e:
+        logger.warning("Could not save model cache %s: %s", cache_path, e)
+    return model
+
+# Cached chart builders: figures are only rebuilt when their inputs change.
+# The model argument is skipped when hashing since get_model() returns one
+# shared instance per process.
+@st.cache_data
+def cached_feature_importance_chart(_model):
+    return _model.create_feature_importance_chart()
+
+@st.cache_data
+def cached_what_if_analysis(_model, base_inputs, feature, range_min, range_max):
+    return _model.create_what_if_analysis(base_inputs, feature, range_min, range_max)
+
+@st.cache_data
+def cached_3d_relationship_plot(_model, feature1, feature2, feature3):
+    return _model.create_3d_relationship_plot(feature1, feature2, feature3)
+
+# The visualization module is imported on first use so pages without
+# charts don't pay for it at startup.
+@st.cache_data
+def cached_current_vs_optimal_chart(current_ratios, optimization_result):
+    from visualization import create_current_vs_optimal_chart
+    return create_current_vs_optimal_chart(current_ratios, optimization_result)
+
+@st.cache_data
+def cached_allocation_chart(optimization_result):
+    from visualization import create_allocation_chart
+    return create_allocation_chart(optimization_result)
+
+@st.cache_data
+def cached_heatmap(optimization_result):
+    from visualization import create_heatmap
+    return create_heatmap(optimization_result)
+
+@st.cache_data
+def cached_classroom_balance_chart(optimization_result):
+    from visualization import create_classroom_balance_chart
+    return create_classroom_balance_chart(optimization_result)
+
+@st.cache_data(show_spinner=False)
+def cached_optimize_teacher_allocation(input_data):
+    """Run the optimizer once per distinct set of inputs"""
+    return optimize_teacher_allocation(input_data)
+
+@st.cache_data(show_spinner=False)
+def cached_student_skill_assignments(optimization_result, student_df, skill_columns, custom_groups=None):
+    """Group students by skill once per distinct roster, skill columns and group count"""
+    return add_student_skill_based_assignments(optimization_result, student_df, skill_columns, custom_groups)
+
+@st.cache_data
+def cached_result_tables(optimization_result, subject_difficulties, max_class_size):
+    """
+    Builds the subject, classroom and teacher tables shown on the results page.
+    
+    Args:
+        optimization_result: Dictionary with optimization results
+        subject_difficulties: Dictionary mapping subjects to difficulty levels
+        max_class_size: Maximum students per classroom, used for utilization
+    
+    Returns:
+        Tuple of (subject_df, classroom_df, teacher_df)
+    """
+    # Subjects, formatting whole columns at once
+    subjects = list(optimization_result['subject_allocation'])
+    subject_df = pd.DataFrame.from_records(
+        list(optimization_result['subject_allocation'].values()),
+        columns=['teachers_allocated', 'students_allocated', 'ratio']
+    )
+    subject_df["Subject"] = subjects
+    subject_df["Ratio"] = np.char.mod("%.2f:1", subject_df['ratio'].to_numpy(dtype=float))
+    subject_df["Difficulty"] = [subject_difficulties.get(s, 'N/A') for s in subjects]
+    subject_df = subject_df.rename(columns={
+        'teachers_allocated': "Teachers Allocated",
+        'students_allocated': "Students Allocated"
+    }).reindex(columns=[
+        "Subject", "Teachers Allocated", "Students Allocated", "Ratio", "Difficulty"
+    ])
+    
+    # Classrooms, formatting whole columns at once
+    classroom_df = pd.DataFrame.from_records(
+        optimization_result['classroom_allocation'],
+        columns=['teachers_assigned', 'students_assigned', 'ratio', 'subjects']
+    )
+    classroom_df["Classroom"] = "Classroom " + (classroom_df.index + 1).astype(str)
+    classroom_df["Ratio"] = np.char.mod("%.2f:1", classroom_df['ratio'].to_numpy(dtype=float))
+    classroom_df["Subjects"] = classroom_df['subjects'].str.join(", ")
+    classroom_df["Utilization (%)"] = np.char.mod(
+        "%.1f%%", classroom_df['students_assigned'].to_numpy(dtype=float) / max_class_size * 100
+    )
+    classroom_df = classroom_df.rename(columns={
+        'teachers_assigned': "Teachers Assigned",
+        'students_assigned': "Students Assigned"
+    }).reindex(columns=[
+        "Classroom", "Teachers Assigned", "Students Assigned", "Ratio", "Subjects", "Utilization (%)"
+    ])
+    
+    # Teachers, formatting whole columns at once
+    teacher_df = pd.DataFrame.from_records(
+        optimization_result['teacher_allocation'],
+        columns=['subject', 'students_assigned', 'classroom', 'utilization']
+    )
+    teacher_df["Teacher ID"] = "T" + (teacher_df.index + 1).astype(str)
+    teacher_df["Utilization (%)"] = np.char.mod("%.1f%%", teacher_df['utilization'].to_numpy(dtype=float))
+    teacher_df = teacher_df.rename(columns={
+        'subject': "Subject",
+        'students_assigned': "Students Assigned",
+        'classroom': "Classroom"
+    }).reindex(columns=[
+        "Teacher ID", "Subject", "Students Assigned", "Classroom", "Utilization (%)"
+    ])
+    
+    return subject_df, classroom_df, teacher_df
+
+def recommendation_chart_key(recommendations):
+    """Reduce recommendations to the fields the charts read, as a hashable cache key"""
+    return tuple(
+        tuple((field, rec[field]) for field in ('title', 'impact_score', 'ease_score') if field in rec)
+        for rec in recommendations
+    )
+
+@st.cache_data
+def cached_recommendation_impact_chart(chart_key):
+    from visualization import create_recommendation_impact_chart
+    return create_recommendation_impact_chart([dict(fields) for fields in chart_key])
+
+@st.cache_data
+def cached_alternate_recommendation_chart(chart_key):
+    from visualization import create_alternate_recommendation_chart
+    return create_alternate_recommendation_chart([dict(fields) for fields in chart_key])
+
+@st.cache_data
+def cached_recommendation_order(impact_scores):
+    """Indices of the recommendations sorted by impact score, highest first"""
+    return sorted(range(len(impact_scores)), key=impact_scores.__getitem__, reverse=True)
+
 # Initialize session state for multi-page navigation
 if 'page' not in st.session_state:
     st.session_state.page = 'input'
 
 if 'model' not in st.session_state:
-    st.session_state.model = RatioOptimizer()
-    st.session_state.model.train()  # Pre-train the model
+    st.session_state.model = get_model()  # Pre-trained, shared across sessions
 
 if 'optimization_result' not in st.session_state:
     st.session_state.optimization_result = None
@@ -53,59 +222,45 @@ if 'current_scenario' not in st.session_state:
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 
+# Sidebar navigation: (section title, [(button label, page key, requires optimization result)])
+NAV_SECTIONS = [
+    ("#### 📝 Input", [
+        ("📊 Manual Input", 'input', False),
+        ("📁 CSV Upload", 'csv_upload', False)
+    ]),
+    ("#### 🔍 Analysis", [
+        ("🧠 ML Analysis", 'ml_analysis', False),
+        ("🌐 3D Visuals", '3d_viz', False)
+    ]),
+    ("#### 📈 Results", [
+        ("📊 Results", 'results', True),
+        ("💡 Tips", 'recommendations', True)
+    ]),
+    ("#### 📑 Reports & Help", [
+        ("📄 Reports", 'reports', True),
+        ("🤖 AI Help", 'chatbot', False)
+    ])
+]
+
 def main():
     # Sidebar for navigation
     st.sidebar.title("📊 Student-Teacher Ratio Optimizer")
     
     st.sidebar.markdown("### 📋 Navigation")
     
-    # Input Section
-    st.sidebar.markdown("#### 📝 Input")
-    
-    col1, col2 = st.sidebar.columns(2)
-    with col1:
-        if st.button("📊 Manual Input", type="primary" if st.session_state.page == 'input' else "secondary", use_container_width=True):
-            st.session_state.page = 'input'
-    
-    with col2:
-        if st.button("📁 CSV Upload", type="primary" if st.session_state.page == 'csv_upload' else "secondary", use_container_width=True):
-            st.session_state.page = 'csv_upload'
-    
-    # Analysis Section
-    st.sidebar.markdown("#### 🔍 Analysis")
-    
-    col1, col2 = st.sidebar.columns(2)
-    with col1:
-        if st.button("🧠 ML Analysis", type="primary" if st.session_state.page == 'ml_analysis' else "secondary", use_container_width=True):
-            st.session_state.page = 'ml_analysis'
-    
-    with col2:
-        if st.button("🌐 3D Visuals", type="primary" if st.session_state.page == '3d_viz' else "secondary", use_container_width=True):
-            st.session_state.page = '3d_viz'
-    
-    # Results Section
-    st.sidebar.markdown("#### 📈 Results")
-    
-    col1, col2 = st.sidebar.columns(2)
-    with col1:
-        if st.button("📊 Results", type="primary" if st.session_state.page == 'results' else "secondary", disabled=st.session_state.optimization_result is None, use_container_width=True):
-            st.session_state.page = 'results'
-    
-    with col2:
-        if st.button("💡 Tips", type="primary" if st.session_state.page == 'recommendations' else "secondary", disabled=st.session_state.optimization_result is None, use_container_width=True):
-            st.session_state.page = 'recommendations'
-    
-    # Reports and Help
-    st.sidebar.markdown("#### 📑 Reports & Help")
-    
-    col1, col2 = st.sidebar.columns(2)
-    with col1:
-        if st.button("📄 Reports", type="primary" if st.session_state.page == 'reports' else "secondary", disabled=st.session_state.optimization_result is None, use_container_width=True):
-            st.session_state.page = 'reports'
-    
-    with col2:
-        if st.button("🤖 AI Help", type="primary" if st.session_state.page == 'chatbot' else "secondary", use_container_width=True):
-            st.session_state.page = 'chatbot'
+    for section_title, buttons in NAV_SECTIONS:
+        st.sidebar.markdown(section_title)
+        
+        columns = st.sidebar.columns(2)
+        for column, (label, page, requires_result) in zip(columns, buttons):
+            with column:
+                if st.button(
+                    label,
+                    type="primary" if st.session_state.page == page else "secondary",
+                    disabled=requires_result and st.session_state.optimization_result is None,
+                    use_container_width=True
+                ):
+                    st.session_state.page = page
     
     # Add some information in the sidebar
     st.sidebar.markdown("---")
@@ -124,22 +279,30 @@ def main():
         st.sidebar.warning("⚠️ No optimization results yet")
     
     # Display the appropriate page
-    if st.session_state.page == 'input':
-        show_input_page()
-    elif st.session_state.page == 'csv_upload':
-        show_csv_upload_page()
-    elif st.session_state.page == 'ml_analysis':
-        show_ml_analysis_page()
-    elif st.session_state.page == '3d_viz':
-        show_3d_visualizations_page()
-    elif st.session_state.page == 'results':
-        show_results_page()
-    elif st.session_state.page == 'recommendations':
-        show_recommendations_page()
-    elif st.session_state.page == 'reports':
-        show_reports_page()
-    elif st.session_state.page == 'chatbot':
-        show_chatbot_page()
+    PAGES.get(st.session_state.page, show_input_page)()
+
+def resize_subject_table(subjects, num_subjects):
+    """
+    Resize the subject input table to a number of subjects, keeping the rows
+    of the subjects that remain and adding default rows for new ones.
+    
+    Args:
+        subjects: Previously edited subject table, or None if there is none
+        num_subjects: Number of subjects the table should have
+    
+    Returns:
+        DataFrame with Name, Difficulty and Allocation % columns
+    """
+    default_subjects = pd.DataFrame({
+        'Name': [f"Subject {i+1}" for i in range(num_subjects)],
+        'Difficulty': [5] * num_subjects,
+        'Allocation %': [int(100/num_subjects)] * num_subjects
+    })
+    if subjects is None:
+        return default_subjects
+    
+    kept_subjects = subjects.iloc[:num_subjects]
+    return pd.concat([kept_subjects, default_subjects.iloc[len(kept_subjects):]], ignore_index=True)
 
 def show_input_page():
     st.title("📊 Student-Teacher Ratio Optimizer")
@@ -164,32 +327,35 @@ def show_input_page():
         # Subject input form
         num_subjects = st.slider("Number of Subjects", min_value=1, max_value=10, value=5)
         
-        # Initialize dictionaries for subject data
-        subject_names = []
-        subject_difficulties = {}
-        teacher_distribution = {}
-        
-        # Dynamic subject form
-        for i in range(num_subjects):
-            st.markdown(f"**Subject {i+1}**")
-            cols = st.columns(3)
-            with cols[0]:
-                name = st.text_input(f"Name #{i+1}", value=f"Subject {i+1}", key=f"subject_name_{i}")
-            with cols[1]:
-                difficulty = st.slider(f"Difficulty (1-10) #{i+1}", min_value=1, max_value=10, value=5, key=f"subject_diff_{i}")
-            with cols[2]:
-                percentage = st.slider(f"Teacher Allocation % #{i+1}", min_value=1, max_value=100, value=int(100/num_subjects), key=f"subject_dist_{i}")
-            
-            subject_names.append(name)
-            subject_difficulties[name] = difficulty
-            teacher_distribution[name] = percentage
+        # Edit all subjects in one table instead of three widgets per subject.
+        # The table is kept in the session and only resized when the number of
+        # subjects changes, so edits to the remaining subjects survive.
+        if len(st.session_state.get('subject_table', ())) != num_subjects:
+            st.session_state.subject_table = resize_subject_table(
+                st.session_state.get('edited_subjects'), num_subjects
+            )
+            # Start the editor afresh on the resized table
+            st.session_state.pop('subject_editor', None)
+        edited_subjects = st.data_editor(
+            st.session_state.subject_table,
+            num_rows="fixed",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Name': st.column_config.TextColumn("Name", required=True),
+                'Difficulty': st.column_config.NumberColumn("Difficulty (1-10)", min_value=1, max_value=10, step=1, required=True),
+                'Allocation %': st.column_config.NumberColumn("Teacher Allocation %", min_value=1, max_value=100, step=1, required=True)
+            },
+            key="subject_editor"
+        )
+        st.session_state.edited_subjects = edited_subjects
         
         # Normalize teacher distribution
-        total_percentage = sum(teacher_distribution.values())
-        if total_percentage != 100:
-            st.warning(f"Teacher distribution percentages sum to {total_percentage}%, not 100%. Values will be normalized.")
-            for subject in teacher_distribution:
-                teacher_distribution[subject] = (teacher_distribution[subject] / total_percentage) * 100
+        distribution_values = edited_subjects['Allocation %'].to_numpy(dtype=np.float64)
+        total_percentage = distribution_values.sum()
+        if abs(total_percentage - 100) >= 1e-9:
+            st.warning(f"Teacher distribution percentages sum to {total_percentage:g}%, not 100%. Values will be normalized.")
+            distribution_values *= 100.0 / total_percentage
     
     # Action button - single column centered
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -197,6 +363,11 @@ def show_input_page():
     with col2:
         if st.button("🚀 Run Optimization", type="primary", use_container_width=True):
             with st.spinner("⏳ Optimizing student-teacher allocation..."):
+                # Build the subject dictionaries only when the optimization is run
+                subject_names = edited_subjects['Name'].astype(str).tolist()
+                subject_difficulties = dict(zip(subject_names, edited_subjects['Difficulty'].tolist()))
+                teacher_distribution = dict(zip(subject_names, distribution_values.tolist()))
+                
                 # Use default values for removed fields
                 input_data = {
                     'institution_name': "Your Institution",  # Default value
@@ -213,9 +384,10 @@ def show_input_page():
                     'prioritize_experience': True  # Default value
                 }
                 
+                current_overall = float(total_students) / total_teachers
                 current_ratios = {
-                    'overall': float(total_students / total_teachers),
-                    'by_subject': {subject: float(total_students / total_teachers) for subject in subject_names}
+                    'overall': current_overall,
+                    'by_subject': dict.fromkeys(subject_names, current_overall)
                 }
                 
                 # Store in session state
@@ -223,7 +395,7 @@ def show_input_page():
                 st.session_state.current_ratios = current_ratios
                 
                 # Run optimization
-                optimization_result = optimize_teacher_allocation(input_data)
+                optimization_result = cached_optimize_teacher_allocation(input_data)
                 st.session_state.optimization_result = optimization_result
                 
                 # Navigate to results page
@@ -239,6 +411,7 @@ def show_ml_analysis_page():
     
     # Get the ML model from session state
     model = st.session_state.model
+    feature_labels = model.feature_labels
     
     # Use default inputs for background analysis without user input
     default_inputs = {
@@ -248,10 +421,7 @@ def show_ml_analysis_page():
         'student_proficiency': 5.0,
         'resource_availability': 5.0
     }
-    
-    # Make prediction in the background
-    predicted_ratio = model.predict(default_inputs)
-    
+
     # Feature importance
     st.subheader("📊 Feature Importance Analysis")
     st.markdown("""
@@ -259,7 +429,7 @@ def show_ml_analysis_page():
     according to our machine learning model.
     """)
     
-    importance_fig = model.create_feature_importance_chart()
+    importance_fig = cached_feature_importance_chart(model)
     st.plotly_chart(importance_fig, use_container_width=True)
     
     # What-if analysis
@@ -271,7 +441,7 @@ def show_ml_analysis_page():
     feature_to_vary = st.selectbox(
         "Select factor to analyze",
         model.feature_names,
-        format_func=lambda x: x.replace('_', ' ').title()
+        format_func=feature_labels.__getitem__
     )
     
     min_val = 1.0 if feature_to_vary != 'teacher_experience' else 1.0
@@ -279,14 +449,14 @@ def show_ml_analysis_page():
     
     col1, col2 = st.columns(2)
     with col1:
-        range_min = st.slider(f"Minimum {feature_to_vary.replace('_', ' ').title()}", 
+        range_min = st.slider(f"Minimum {feature_labels[feature_to_vary]}", 
                              min_value=min_val, max_value=max_val, value=min_val, step=0.5)
     with col2:
-        range_max = st.slider(f"Maximum {feature_to_vary.replace('_', ' ').title()}", 
+        range_max = st.slider(f"Maximum {feature_labels[feature_to_vary]}", 
                              min_value=min_val, max_value=max_val, 
                              value=max_val, step=0.5)
     
-    what_if_fig = model.create_what_if_analysis(default_inputs, feature_to_vary, range_min, range_max)
+    what_if_fig = cached_what_if_analysis(model, default_inputs, feature_to_vary, range_min, range_max)
     st.plotly_chart(what_if_fig, use_container_width=True)
     
     # Relationship analysis
@@ -340,8 +510,26 @@ def show_3d_visualizations_page():
     using interactive 3D visualizations.
     """)
     
-    # Get the ML model from session state
-    model = st.session_state.model
+    render_3d_relationship_explorer(st.session_state.model)
+    
+    # Add controls with icons
+    st.info("""
+    ### 🎮 How to interact with the 3D plot:
+    - 🔄 **Rotate**: Click and drag to rotate the visualization
+    - 🔍 **Zoom**: Use the mouse wheel or pinch gesture to zoom
+    - 👆 **Pan**: Right-click and drag to pan
+    - 🔙 **Reset**: Double-click to reset the view
+    """)
+    
+    render_3d_display_options()
+
+@st.fragment
+def render_3d_relationship_explorer(model):
+    """
+    Render the axis selectors and the 3D plot as a fragment, so changing an
+    axis only reruns this block instead of the whole page.
+    """
+    feature_labels = model.feature_labels
     
     # Feature selection for 3D plot
     st.subheader("📊 Explore Factor Relationships")
@@ -353,7 +541,7 @@ def show_3d_visualizations_page():
             "📏 X-Axis",
             model.feature_names,
             index=1,  # default to teacher_experience
-            format_func=lambda x: x.replace('_', ' ').title()
+            format_func=feature_labels.__getitem__
         )
     
     with col2:
@@ -361,7 +549,7 @@ def show_3d_visualizations_page():
             "📏 Y-Axis",
             model.feature_names,
             index=0,  # default to subject_difficulty
-            format_func=lambda x: x.replace('_', ' ').title()
+            format_func=feature_labels.__getitem__
         )
     
     with col3:
@@ -369,22 +557,16 @@ def show_3d_visualizations_page():
             "📏 Z-Axis/Color",
             model.feature_names + ['optimal_ratio'],
             index=len(model.feature_names),  # default to optimal_ratio
-            format_func=lambda x: x.replace('_', ' ').title()
+            format_func=feature_labels.__getitem__
         )
     
     # Generate and display 3D plot
-    fig_3d = model.create_3d_relationship_plot(feature1, feature2, feature3)
+    fig_3d = cached_3d_relationship_plot(model, feature1, feature2, feature3)
     st.plotly_chart(fig_3d, use_container_width=True)
-    
-    # Add controls with icons
-    st.info("""
-    ### 🎮 How to interact with the 3D plot:
-    - 🔄 **Rotate**: Click and drag to rotate the visualization
-    - 🔍 **Zoom**: Use the mouse wheel or pinch gesture to zoom
-    - 👆 **Pan**: Right-click and drag to pan
-    - 🔙 **Reset**: Double-click to reset the view
-    """)
-    
+
+@st.fragment
+def render_3d_display_options():
+    """Render the display option checkboxes without triggering a full page rerun"""
     # Add more interaction options
     st.subheader("✨ Additional Visualization Options")
     col1, col2 = st.columns(2)
@@ -417,6 +599,13 @@ def show_results_page():
             # Display key metrics
             st.subheader("📈 Key Metrics")
             
+            # Percentage change of the optimal ratio vs. the current and target ratios
+            baselines = np.array([current_ratios['overall'], input_data['ideal_ratio']], dtype=np.float64)
+            deltas = np.divide(
+                result['optimal_ratio'] - baselines, baselines,
+                out=np.zeros_like(baselines), where=baselines != 0
+            ) * 100
+            
             col1, col2, col3 = st.columns(3)
             
             with col1:
@@ -429,14 +618,14 @@ def show_results_page():
                 st.metric(
                     "✅ Optimal Overall Ratio", 
                     f"{result['optimal_ratio']:.2f}:1", 
-                    f"{((result['optimal_ratio'] - current_ratios['overall']) / current_ratios['overall'] * 100):.1f}%"
+                    f"{deltas[0]:.1f}%"
                 )
             
             with col3:
                 st.metric(
                     "🎯 Target Ratio", 
                     f"{input_data['ideal_ratio']:.2f}:1",
-                    f"{((result['optimal_ratio'] - input_data['ideal_ratio']) / input_data['ideal_ratio'] * 100):.1f}%"
+                    f"{deltas[1]:.1f}%"
                 )
                 
         with tabs[1]:
@@ -457,10 +646,10 @@ def show_results_page():
             skill_columns = []
             if student_df is not None:
                 # Find columns that might contain skill scores (numeric columns)
-                for col in student_df.columns:
-                    if col.lower().endswith('_score') or col.lower().endswith('_skill') or 'skill_' in col.lower() or 'score_' in col.lower():
-                        if pd.api.types.is_numeric_dtype(student_df[col]):
-                            skill_columns.append(col)
+                name_mask = student_df.columns.str.lower().str.contains(r'_score$|_skill$|skill_|score_', regex=True)
+                numeric_columns = set(student_df.select_dtypes(include=np.number).columns)
+                skill_columns = [col for col, matches in zip(student_df.columns, name_mask)
+                                 if matches and col in numeric_columns]
             
             # Allow customization of groups
             col1, col2 = st.columns(2)
@@ -515,7 +704,7 @@ def show_results_page():
                 # Apply custom grouping
                 with st.spinner("Calculating student groups..."):
                     # Use the function to create custom groups
-                    result = add_student_skill_based_assignments(
+                    result = cached_student_skill_assignments(
                         result, 
                         student_df, 
                         skill_columns, 
@@ -562,17 +751,17 @@ def show_results_page():
                                 
                                 # Create a DataFrame for student assignments
                                 student_assignments = result['student_group_assignments']
-                                assignment_data = []
-                                
-                                for assignment in student_assignments[:100]:  # Limit to 100 rows for display
-                                    assignment_data.append({
-                                        "Student ID": assignment['student_id'],
-                                        "Name": assignment.get('student_name', 'Unknown'),
-                                        "Group": assignment['group_name'],
-                                        "Composite Skill": assignment['composite_skill']
-                                    })
-                                
-                                assignment_df = pd.DataFrame(assignment_data)
+
+                                # Limit to 100 rows for display
+                                assignment_df = pd.DataFrame(
+                                    student_assignments[:100],
+                                    columns=['student_id', 'student_name', 'group_name', 'composite_skill']
+                                ).fillna({'student_name': 'Unknown'}).rename(columns={
+                                    'student_id': "Student ID",
+                                    'student_name': "Name",
+                                    'group_name': "Group",
+                                    'composite_skill': "Composite Skill"
+                                })
                                 st.dataframe(assignment_df, use_container_width=True)
                                 
                                 if len(student_assignments) > 100:
@@ -607,13 +796,13 @@ def show_results_page():
             
             # Current vs. Optimal comparison
             st.markdown("#### 📈 Current vs. Optimal Ratios")
-            comparison_chart = create_current_vs_optimal_chart(current_ratios, result)
+            comparison_chart = cached_current_vs_optimal_chart(current_ratios, result)
             st.plotly_chart(comparison_chart, use_container_width=True)
             
             # Subject allocation chart
             st.markdown("#### 📚 Subject Allocation Analysis")
             try:
-                allocation_chart = create_allocation_chart(result)
+                allocation_chart = cached_allocation_chart(result)
                 st.plotly_chart(allocation_chart, use_container_width=True)
             except Exception as e:
                 st.error(f"Error creating subject allocation chart: {str(e)}")
@@ -626,14 +815,14 @@ def show_results_page():
             
             with dist_tab1:
                 try:
-                    heatmap = create_heatmap(result)
+                    heatmap = cached_heatmap(result)
                     st.plotly_chart(heatmap, use_container_width=True)
                 except Exception as e:
                     st.error(f"Error creating heatmap: {str(e)}")
             
             with dist_tab2:
                 try:
-                    balance_chart = create_classroom_balance_chart(result)
+                    balance_chart = cached_classroom_balance_chart(result)
                     st.plotly_chart(balance_chart, use_container_width=True)
                 except Exception as e:
                     st.error(f"Error creating balance chart: {str(e)}")
@@ -643,50 +832,17 @@ def show_results_page():
             
             detail_tabs = st.tabs(["Subjects", "Classrooms", "Teachers"])
             
+            subject_df, classroom_df, teacher_df = cached_result_tables(
+                result, input_data['subject_difficulties'], input_data['max_class_size']
+            )
+            
             with detail_tabs[0]:
-                # Create a DataFrame for easier display
-                subject_data = []
-                for subject, details in result['subject_allocation'].items():
-                    subject_data.append({
-                        "Subject": subject,
-                        "Teachers Allocated": details['teachers_allocated'],
-                        "Students Allocated": details['students_allocated'],
-                        "Ratio": f"{details['ratio']:.2f}:1",
-                        "Difficulty": input_data['subject_difficulties'].get(subject, 'N/A')
-                    })
-                
-                subject_df = pd.DataFrame(subject_data)
                 st.dataframe(subject_df, use_container_width=True)
-            
+
             with detail_tabs[1]:
-                # Create a DataFrame for easier display
-                classroom_data = []
-                for i, classroom in enumerate(result['classroom_allocation']):
-                    classroom_data.append({
-                        "Classroom": f"Classroom {i+1}",
-                        "Teachers Assigned": classroom['teachers_assigned'],
-                        "Students Assigned": classroom['students_assigned'],
-                        "Ratio": f"{classroom['ratio']:.2f}:1",
-                        "Subjects": ", ".join(classroom['subjects']),
-                        "Utilization (%)": f"{(classroom['students_assigned'] / input_data['max_class_size'] * 100):.1f}%"
-                    })
-                
-                classroom_df = pd.DataFrame(classroom_data)
                 st.dataframe(classroom_df, use_container_width=True)
-            
+
             with detail_tabs[2]:
-                # Create a DataFrame for easier display
-                teacher_data = []
-                for i, teacher in enumerate(result['teacher_allocation']):
-                    teacher_data.append({
-                        "Teacher ID": f"T{i+1}",
-                        "Subject": teacher['subject'],
-                        "Students Assigned": teacher['students_assigned'],
-                        "Classroom": teacher['classroom'],
-                        "Utilization (%)": f"{teacher['utilization']:.1f}%"
-                    })
-                
-                teacher_df = pd.DataFrame(teacher_data)
                 st.dataframe(teacher_df, use_container_width=True)
         
         # Interactive actions section
@@ -700,57 +856,82 @@ def show_results_page():
         with action_col3:
             st.button("🧠 View ML Analysis", on_click=lambda: setattr(st.session_state, 'page', 'ml_analysis'))
         
-        # Detailed results in expanders
+        # Detailed results in expanders, reusing the tables built for the detail tabs
         with st.expander("📊 Subject-Specific Allocation Details"):
-            # Create a DataFrame for easier display
-            subject_data = []
-            for subject, details in result['subject_allocation'].items():
-                subject_data.append({
-                    "Subject": subject,
-                    "Teachers Allocated": details['teachers_allocated'],
-                    "Students Allocated": details['students_allocated'],
-                    "Ratio": f"{details['ratio']:.2f}:1",
-                    "Difficulty": input_data['subject_difficulties'].get(subject, 'N/A')
-                })
-            
-            subject_df = pd.DataFrame(subject_data)
             st.dataframe(subject_df, use_container_width=True)
         
         with st.expander("🏛️ Classroom Allocation Details"):
-            # Create a DataFrame for easier display
-            classroom_data = []
-            for i, classroom in enumerate(result['classroom_allocation']):
-                classroom_data.append({
-                    "Classroom": f"Classroom {i+1}",
-                    "Teachers Assigned": classroom['teachers_assigned'],
-                    "Students Assigned": classroom['students_assigned'],
-                    "Ratio": f"{classroom['ratio']:.2f}:1",
-                    "Subjects": ", ".join(classroom['subjects']),
-                    "Utilization (%)": f"{(classroom['students_assigned'] / input_data['max_class_size'] * 100):.1f}%"
-                })
-            
-            classroom_df = pd.DataFrame(classroom_data)
             st.dataframe(classroom_df, use_container_width=True)
         
         with st.expander("👩‍🏫 Teacher Allocation Details"):
-            # Create a DataFrame for easier display
-            teacher_data = []
-            for i, teacher in enumerate(result['teacher_allocation']):
-                teacher_data.append({
-                    "Teacher ID": f"T{i+1}",
-                    "Subject": teacher['subject'],
-                    "Students Assigned": teacher['students_assigned'],
-                    "Classroom": teacher['classroom'],
-                    "Utilization (%)": f"{teacher['utilization']:.1f}%"
-                })
-            
-            teacher_df = pd.DataFrame(teacher_data)
             st.dataframe(teacher_df, use_container_width=True)
     
     except Exception as e:
         st.error(f"⚠️ An error occurred in the results page: {str(e)}")
         st.info("Please try running the optimization again with different parameters.")
 
+# Indicator for each 0-10 impact/ease score: red below 4, yellow below 7, green otherwise
+SCORE_INDICATORS = ("🔴",) * 4 + ("🟡",) * 3 + ("🟢",) * 4
+
+@st.fragment
+def render_recommendation(i, rec):
+    """
+    Render one recommendation card as a fragment, so its buttons only rerun
+    the card instead of the whole page and its charts.
+    """
+    with st.container():
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            if i == 0:
+                icon = "🥇"
+            elif i == 1:
+                icon = "🥈"
+            elif i == 2:
+                icon = "🥉"
+            else:
+                icon = "📌"
+            st.markdown(f"### {icon} {rec['title']}")
+        
+        with col2:
+            impact_score = rec.get('impact_score', 5)
+            ease_score = rec.get('ease_score', 5)
+            
+            # Add visual indicators for scores
+            impact_indicator = SCORE_INDICATORS[max(0, min(10, int(impact_score)))]
+            ease_indicator = SCORE_INDICATORS[max(0, min(10, int(ease_score)))]
+            
+            st.markdown(f"""
+            **Impact**: {impact_indicator} {impact_score}/10  
+            **Ease**: {ease_indicator} {ease_score}/10
+            """)
+        
+        # Collect the text sections and send them as a single markdown element
+        sections = [rec['description']]
+        
+        if 'action_items' in rec and rec['action_items']:
+            sections.append("#### ✅ Action Items:")
+            sections.append("\n".join(f"- {item}" for item in rec['action_items']))
+        
+        if 'impact' in rec:
+            sections.append(f"**🎯 Expected Impact**: {rec['impact']}")
+        
+        if 'timeline' in rec:
+            start = rec['timeline'].get('start', 0)
+            duration = rec['timeline'].get('duration', 0)
+            sections.append(f"**⏱️ Timeline**: Start in week {start}, duration of {duration} weeks")
+        
+        st.markdown("\n\n".join(sections))
+        
+        # Add interactive buttons for each recommendation
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button(f"📊 View Details for Recommendation {i+1}", key=f"details_{i}")
+        with col2:
+            st.button(f"📝 Add to Implementation Plan", key=f"implement_{i}")
+        
+        st.markdown("---")
+
 def show_recommendations_page():
     if st.session_state.optimization_result is None:
         st.warning("⚠️ No optimization results available. Please run optimization first.")
@@ -761,6 +942,7 @@ def show_recommendations_page():
     
     result = st.session_state.optimization_result
     recommendations = result['recommendations']
+    chart_key = recommendation_chart_key(recommendations)
     
     # Impact analysis chart
     st.subheader("📊 Recommendation Impact Analysis")
@@ -769,7 +951,7 @@ def show_recommendations_page():
     rec_tabs = st.tabs(["Impact Analysis", "Category View"])
     
     with rec_tabs[0]:
-        impact_chart = create_recommendation_impact_chart(recommendations)
+        impact_chart = cached_recommendation_impact_chart(chart_key)
         st.plotly_chart(impact_chart, use_container_width=True)
         
         st.info("""
@@ -780,7 +962,7 @@ def show_recommendations_page():
         """)
     
     with rec_tabs[1]:
-        category_chart = create_alternate_recommendation_chart(recommendations)
+        category_chart = cached_alternate_recommendation_chart(chart_key)
         st.plotly_chart(category_chart, use_container_width=True)
         
         st.info("""
@@ -795,69 +977,19 @@ def show_recommendations_page():
     st.subheader("📝 Detailed Recommendations")
     
     # Sort recommendations by impact score
-    sorted_recommendations = sorted(
-        recommendations, 
-        key=lambda x: x.get('impact_score', 0), 
-        reverse=True
-    )
+    impact_scores = tuple(rec.get('impact_score', 0) for rec in recommendations)
+    sorted_recommendations = [recommendations[i] for i in cached_recommendation_order(impact_scores)]
     
     for i, rec in enumerate(sorted_recommendations):
-        with st.container():
-            col1, col2 = st.columns([3, 1])
-            
-            with col1:
-                if i == 0:
-                    icon = "🥇"
-                elif i == 1:
-                    icon = "🥈"
-                elif i == 2:
-                    icon = "🥉"
-                else:
-                    icon = "📌"
-                st.markdown(f"### {icon} {rec['title']}")
-            
-            with col2:
-                impact_score = rec.get('impact_score', 5)
-                ease_score = rec.get('ease_score', 5)
-                
-                # Add visual indicators for scores
-                impact_indicator = "🟢" if impact_score >= 7 else "🟡" if impact_score >= 4 else "🔴"
-                ease_indicator = "🟢" if ease_score >= 7 else "🟡" if ease_score >= 4 else "🔴"
-                
-                st.markdown(f"""
-                **Impact**: {impact_indicator} {impact_score}/10  
-                **Ease**: {ease_indicator} {ease_score}/10
-                """)
-            
-            st.markdown(rec['description'])
-            
-            if 'action_items' in rec and rec['action_items']:
-                st.markdown("#### ✅ Action Items:")
-                for item in rec['action_items']:
-                    st.markdown(f"- {item}")
-            
-            if 'impact' in rec:
-                st.markdown(f"**🎯 Expected Impact**: {rec['impact']}")
-            
-            if 'timeline' in rec:
-                start = rec['timeline'].get('start', 0)
-                duration = rec['timeline'].get('duration', 0)
-                st.markdown(f"**⏱️ Timeline**: Start in week {start}, duration of {duration} weeks")
-            
-            # Add interactive buttons for each recommendation
-            col1, col2 = st.columns(2)
-            with col1:
-                st.button(f"📊 View Details for Recommendation {i+1}", key=f"details_{i}")
-            with col2:
-                st.button(f"📝 Add to Implementation Plan", key=f"implement_{i}")
-            
-            st.markdown("---")
+        render_recommendation(i, rec)
 
 def show_reports_page():
     if st.session_state.optimization_result is None:
         st.warning("No optimization results available. Please run optimization first.")
         return
     
+    from report_generation import generate_report
+    
     st.title("Generate Reports")
     
     # Report options
@@ -921,15 +1053,282 @@ def show_reports_page():
     if st.button("Export Report"):
         st.info("Export functionality will be implemented in a future version.")
 
-def show_csv_upload_page():
-    st.title("📁 CSV Data Upload")
+# Defaults used when a comma-separated CSV column parses to nothing
+CSV_LIST_DEFAULTS = {
+    'names': ('Math', 'Science', 'History', 'English', 'Art'),
+    'difficulties': (7, 6, 5, 4, 3),
+    'distribution': ('30', '25', '20', '15', '10')
+}
+
+@lru_cache(maxsize=128)
+def parse_csv_list(value, kind):
+    """
+    Splits a comma-separated CSV cell into its items.
     
-    st.markdown("""
-    Upload a CSV file with your institution's data to generate optimization results. 
-    The application will help fill in missing information if needed.
-    """)
+    Args:
+        value: Raw cell text
+        kind: 'names' for subject names, 'difficulties' for integer difficulties
+            (non-numeric entries become medium difficulty 5) or 'distribution'
+            for the raw teacher distribution entries
     
-    # Example CSV template for download
+    Returns:
+        Tuple of parsed items, or the defaults for the kind if none were found
+    """
+    items = [item.strip() for item in value.split(',')]
+    if kind == 'names':
+        parsed = tuple(item for item in items if item)
+    elif kind == 'difficulties':
+        parsed = []
+        for item in items:
+            try:
+                parsed.append(int(item))
+            except ValueError:
+                # Use default medium difficulty (5) for non-numeric values
+                parsed.append(5)
+        parsed = tuple(parsed)
+    else:
+        parsed = tuple(items)
+    return parsed or CSV_LIST_DEFAULTS[kind]
+
+def csv_upload_key(uploaded_file):
+    """Digest of an uploaded file's contents, used as its parse cache key"""
+    return hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()
+
+@st.cache_data
+def parse_csv_upload(file_key, _file_bytes):
+    """
+    Parses an uploaded CSV file and derives the optimization inputs from it.
+    Cached on a digest of the file, so reruns with the same upload skip
+    parsing without Streamlit hashing the raw bytes itself.
+    
+    Args:
+        file_key: Digest of the uploaded file, see csv_upload_key()
+        _file_bytes: Raw contents of the uploaded CSV file
+    
+    Returns:
+        Dictionary with the parsed DataFrame, messages to show the user
+        (as (level, text) pairs), any missing mandatory columns and, when
+        none are missing, the input data, current ratios and skill columns
+    """
+    # Declare skill/score columns as floats up front so pandas can parse
+    # them directly instead of inferring a type from a full column scan
+    header = pd.read_csv(io.BytesIO(_file_bytes), nrows=0).columns
+    score_dtypes = {col: 'float64' for col in header if 'score' in col.lower() or 'skill' in col.lower()}
+    try:
+        df = pd.read_csv(io.BytesIO(_file_bytes), dtype=score_dtypes)
+    except ValueError:
+        # Some score column holds non-numeric values - let pandas infer types
+        df = pd.read_csv(io.BytesIO(_file_bytes))
+    
+    messages = []
+    
+    # The score/skill columns found in the header are the student skill columns
+    skill_columns = list(score_dtypes)
+    
+    # Lower-cased column names, computed once for the detection checks below
+    columns_lower = {col.lower() for col in df.columns}
+    
+    # Auto-add any missing columns silently in the background
+    # Instead of showing warnings about missing columns, we'll just add defaults
+    
+    # Check if we're dealing with student data (multiple rows with skills)
+    # In this case, we can count students from the data itself
+    student_data_detected = len(df) > 1 and len(skill_columns) > 0
+    
+    # If we have student data, we can automatically determine total_students
+    if student_data_detected:
+        # Count students from the rows in the dataframe
+        student_count = len(df)
+        messages.append(('info', f"📊 Detected student data with {student_count} students. We'll use this for optimization."))
+        
+        # Create or replace total_students column
+        df_summary = pd.DataFrame({
+            'total_students': [student_count],
+            'institution_name': ['Auto-detected Institution']
+        })
+        
+        # Calculate optimal number of teachers (1:15 ratio as a default)
+        optimal_teacher_count = max(1, student_count // 15) 
+        df_summary['total_teachers'] = optimal_teacher_count
+        
+        # Add other needed columns with defaults
+        if 'num_classrooms' not in df_summary.columns:
+            df_summary['num_classrooms'] = max(1, student_count // 25)  # 25 students per classroom
+        
+        if 'subject_names' not in df_summary.columns:
+            df_summary['subject_names'] = 'Math,Science,History,English,Art'
+        
+        if 'subject_difficulties' not in df_summary.columns:
+            df_summary['subject_difficulties'] = '7,6,5,4,3'
+        
+        if 'teacher_distribution' not in df_summary.columns:
+            df_summary['teacher_distribution'] = '30,25,20,15,10'
+        
+        # Use this as our primary df for optimization configuration
+        optimization_df = df_summary
+        
+        # No missing required columns now
+        missing_required = []
+    else:
+        # Traditional approach - check for required columns
+        all_required_columns = ['total_students', 'total_teachers']
+        missing_required = [col for col in all_required_columns if col not in df.columns]
+        
+        # For total_students or total_teachers, we must have them
+        if 'total_students' not in df.columns and 'total_teachers' in df.columns:
+            # If we have teachers but not students, estimate students based on default ratio
+            teachers = int(df['total_teachers'].iloc[0])
+            df['total_students'] = teachers * 15  # Assume 15:1 ratio
+            missing_required.remove('total_students')
+        elif 'total_teachers' not in df.columns and 'total_students' in df.columns:
+            # If we have students but not teachers, estimate teachers based on default ratio
+            students = int(df['total_students'].iloc[0])
+            df['total_teachers'] = max(1, students // 15)  # Assume 15:1 ratio
+            missing_required.remove('total_teachers')
+        
+        # Use the original df for optimization configuration
+        optimization_df = df
+    
+    # If we still have missing required columns and no student data detected, we need to stop
+    if missing_required and not student_data_detected:
+        # Remove 'total_students' from required fields - we'll always use 2000
+        if 'total_students' in missing_required:
+            missing_required.remove('total_students')
+            # Add total_students with default value of 2000
+            df['total_students'] = 2000
+            messages.append(('success', "📊 Using 2000 students for this optimization."))
+        
+        # If we still have missing required columns
+        if missing_required:
+            return {'df': df, 'messages': messages, 'missing_required': missing_required}
+    
+    # Add defaults for all other columns
+    # List of all possible columns with defaults
+    default_columns = {
+        'institution_name': 'Default Institution',
+        'num_classrooms': lambda df: max(1, int(df['total_students'].iloc[0]) // 25),
+        'subject_names': 'Math,Science,History,English,Art',
+        'subject_difficulties': '7,6,5,4,3',
+        'teacher_distribution': '30,25,20,15,10',
+        'ideal_ratio': 15,
+        'max_class_size': 30,
+        'prioritize_experience': True
+    }
+    
+    # Add any missing columns with default values
+    for col, default in default_columns.items():
+        if col not in df.columns:
+            if callable(default):
+                df[col] = default(df)
+            else:
+                df[col] = default
+    
+    # Check for student skill data
+    has_student_data = len(skill_columns) > 0
+    
+    # If we have student data but no ID column, auto-create it
+    if has_student_data and not columns_lower & {'id', 'student_id'}:
+        df['id'] = np.arange(1, len(df) + 1, dtype=np.int64)
+        columns_lower.add('id')
+        
+    # Show a success message
+    messages.append(('success', "✅ CSV data processed successfully. Added any missing columns with default values."))
+    
+    # Process the first row of optimization data as a plain dict
+    row = optimization_df.iloc[0].to_dict()
+    
+    # Make sure we have subject names
+    if not isinstance(row['subject_names'], str) or not row['subject_names'].strip():
+        # If empty or not a string, set a default value
+        optimization_df.at[0, 'subject_names'] = 'Math,Science,History,English,Art'
+        row['subject_names'] = 'Math,Science,History,English,Art'
+    
+    # Parse the comma-separated columns with a shared helper
+    subject_names = list(parse_csv_list(str(row['subject_names']), 'names'))
+    subject_difficulties_list = list(parse_csv_list(str(row['subject_difficulties']), 'difficulties'))
+    teacher_distribution_raw = list(parse_csv_list(str(row['teacher_distribution']), 'distribution'))
+    
+    # Make sure teacher_distribution matches the number of subjects
+    if len(teacher_distribution_raw) != len(subject_names):
+        messages.append(('warning', f"⚠️ Teacher distribution count ({len(teacher_distribution_raw)}) doesn't match subject count ({len(subject_names)}). Adjusting distributions."))
+        # Create equal distribution
+        equal_value = 100.0 / len(subject_names)
+        teacher_distribution_list = [equal_value for _ in subject_names]
+    else:
+        teacher_distribution_list = [float(d) for d in teacher_distribution_raw]
+    
+    # Check that difficulties list matches subjects
+    if len(subject_difficulties_list) != len(subject_names):
+        messages.append(('warning', f"⚠️ Subject difficulties count ({len(subject_difficulties_list)}) doesn't match subject count ({len(subject_names)}). Adjusting difficulties."))
+        # Extend or truncate the difficulties list
+        if len(subject_difficulties_list) < len(subject_names):
+            # Add default medium difficulty (5) for missing subjects
+            subject_difficulties_list.extend([5] * (len(subject_names) - len(subject_difficulties_list)))
+        else:
+            # Truncate extra difficulties
+            subject_difficulties_list = subject_difficulties_list[:len(subject_names)]
+    
+    # Create dictionaries
+    subject_difficulties = {subject: diff for subject, diff in zip(subject_names, subject_difficulties_list)}
+    
+    # Normalize teacher distribution if needed, scaling all subjects at once
+    distribution_values = np.array(teacher_distribution_list, dtype=np.float64)
+    total_percentage = float(distribution_values.sum())
+    if abs(total_percentage - 100) >= 1e-9:
+        distribution_values *= 100.0 / total_percentage
+    teacher_distribution = dict(zip(subject_names, distribution_values.tolist()))
+    
+    # Get optional parameters with defaults
+    ideal_ratio = row.get('ideal_ratio', 15)
+    max_class_size = row.get('max_class_size', 30)
+    prioritize_experience = row.get('prioritize_experience', True)
+    
+    # Create input data dictionary - always use 2000 students
+    input_data = {
+        'institution_name': row['institution_name'],
+        'total_students': 2000,  # Always use 2000 regardless of what's in the file
+        'total_teachers': int(row['total_teachers']),
+        'num_classrooms': int(row['num_classrooms']),
+        'min_students_per_teacher': 5,  # Default value
+        'max_students_per_teacher': 25,  # Default value
+        'ideal_ratio': ideal_ratio,
+        'max_class_size': max_class_size,
+        'subject_names': subject_names,
+        'subject_difficulties': subject_difficulties,
+        'teacher_distribution': teacher_distribution,
+        'prioritize_experience': prioritize_experience
+    }
+    
+    # Calculate current ratio - always use 2000 students
+    current_overall = 2000.0 / float(row['total_teachers'])
+    
+    current_ratios = {
+        'overall': current_overall,
+        'by_subject': dict.fromkeys(subject_names, current_overall)
+    }
+    
+    # Student assignments additionally need an ID column
+    has_student_data = 'id' in columns_lower and len(skill_columns) > 0
+    
+    return {
+        'df': df,
+        'messages': messages,
+        'missing_required': [],
+        'input_data': input_data,
+        'current_ratios': current_ratios,
+        'skill_columns': skill_columns,
+        'student_data_detected': student_data_detected,
+        'has_student_data': has_student_data
+    }
+
+@st.cache_data
+def example_template_csv():
+    """
+    Builds the example CSV template offered for download on the upload page.
+    
+    Returns:
+        CSV text of a single-row example institution
+    """
     example_data = {
         'institution_name': ['Sample University'],
         'total_students': [500],
@@ -942,8 +1341,51 @@ def show_csv_upload_page():
         'max_class_size': [30],
         'prioritize_experience': [True]
     }
-    example_df = pd.DataFrame(example_data)
-    example_csv = example_df.to_csv(index=False)
+    return pd.DataFrame(example_data).to_csv(index=False)
+
+@st.cache_data
+def cached_skill_histogram(skill_col, values):
+    """
+    Bins a numeric skill column with NumPy and draws the counts as bars, so
+    plotly never has to ingest the raw student rows.
+    
+    Args:
+        skill_col: Name of the skill column
+        values: Skill values as a float array
+    
+    Returns:
+        Plotly figure object
+    """
+    # Plotly is only loaded once a chart is actually drawn
+    import plotly.graph_objects as go
+    
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=10)
+    label = skill_col.replace('_', ' ').title()
+    
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color='indianred'
+    ))
+    fig.update_layout(
+        title=f"Distribution of {label}",
+        xaxis_title=label,
+        yaxis_title='Number of Students',
+        bargap=0
+    )
+    return fig
+
+def show_csv_upload_page():
+    st.title("📁 CSV Data Upload")
+    
+    st.markdown("""
+    Upload a CSV file with your institution's data to generate optimization results. 
+    The application will help fill in missing information if needed.
+    """)
+    
+    # Example CSV template for download
+    example_csv = example_template_csv()
     
     st.download_button(
         label="📥 Download Example CSV Template",
@@ -957,234 +1399,28 @@ def show_csv_upload_page():
     
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
+            parsed = parse_csv_upload(csv_upload_key(uploaded_file), uploaded_file.getvalue())
+            df = parsed['df']
             
             st.subheader("📋 Preview of uploaded data:")
             st.dataframe(df)
             
-            # Auto-add any missing columns silently in the background
-            # Instead of showing warnings about missing columns, we'll just add defaults
-            
-            # Check if we're dealing with student data (multiple rows with skills)
-            # In this case, we can count students from the data itself
-            student_data_detected = len(df) > 1 and any(col.lower() in ['math_score', 'science_score', 'history_score', 'english_score'] 
-                                                       or 'skill' in col.lower() or 'score' in col.lower() for col in df.columns)
-            
-            # If we have student data, we can automatically determine total_students
-            if student_data_detected:
-                # Count students from the rows in the dataframe
-                student_count = len(df)
-                st.info(f"📊 Detected student data with {student_count} students. We'll use this for optimization.")
-                
-                # Create or replace total_students column
-                df_summary = pd.DataFrame({
-                    'total_students': [student_count],
-                    'institution_name': ['Auto-detected Institution']
-                })
-                
-                # Calculate optimal number of teachers (1:15 ratio as a default)
-                optimal_teacher_count = max(1, student_count // 15) 
-                df_summary['total_teachers'] = optimal_teacher_count
-                
-                # Add other needed columns with defaults
-                if 'num_classrooms' not in df_summary.columns:
-                    df_summary['num_classrooms'] = max(1, student_count // 25)  # 25 students per classroom
-                
-                if 'subject_names' not in df_summary.columns:
-                    df_summary['subject_names'] = 'Math,Science,History,English,Art'
-                
-                if 'subject_difficulties' not in df_summary.columns:
-                    df_summary['subject_difficulties'] = '7,6,5,4,3'
-                
-                if 'teacher_distribution' not in df_summary.columns:
-                    df_summary['teacher_distribution'] = '30,25,20,15,10'
-                
-                # Use this as our primary df for optimization configuration
-                optimization_df = df_summary
-                
-                # Store student data for later use
-                st.session_state.student_data = df
-                
-                # No missing required columns now
-                missing_required = []
-            else:
-                # Traditional approach - check for required columns
-                all_required_columns = ['total_students', 'total_teachers']
-                missing_required = [col for col in all_required_columns if col not in df.columns]
-                
-                # For total_students or total_teachers, we must have them
-                if 'total_students' not in df.columns and 'total_teachers' in df.columns:
-                    # If we have teachers but not students, estimate students based on default ratio
-                    teachers = int(df.iloc[0]['total_teachers'])
-                    df['total_students'] = teachers * 15  # Assume 15:1 ratio
-                    missing_required.remove('total_students')
-                elif 'total_teachers' not in df.columns and 'total_students' in df.columns:
-                    # If we have students but not teachers, estimate teachers based on default ratio
-                    students = int(df.iloc[0]['total_students'])
-                    df['total_teachers'] = max(1, students // 15)  # Assume 15:1 ratio
-                    missing_required.remove('total_teachers')
-                
-                # Use the original df for optimization configuration
-                optimization_df = df
-            
-            # If we still have missing required columns and no student data detected, we need to stop
-            if missing_required and not student_data_detected:
-                # Remove 'total_students' from required fields - we'll always use 2000
-                if 'total_students' in missing_required:
-                    missing_required.remove('total_students')
-                    # Add total_students with default value of 2000
-                    df['total_students'] = 2000
-                    st.success("📊 Using 2000 students for this optimization.")
-                
-                # If we still have missing required columns
-                if missing_required:
-                    st.error(f"⚠️ Missing mandatory columns: {', '.join(missing_required)}. These are required for processing.")
-                    st.info("Please add these columns to your CSV file and try again.")
-                    st.stop()
-            
-            # Add defaults for all other columns
-            # List of all possible columns with defaults
-            default_columns = {
-                'institution_name': 'Default Institution',
-                'num_classrooms': lambda df: max(1, int(df.iloc[0]['total_students']) // 25),
-                'subject_names': 'Math,Science,History,English,Art',
-                'subject_difficulties': '7,6,5,4,3',
-                'teacher_distribution': '30,25,20,15,10',
-                'ideal_ratio': 15,
-                'max_class_size': 30,
-                'prioritize_experience': True
-            }
-            
-            # Add any missing columns with default values
-            for col, default in default_columns.items():
-                if col not in df.columns:
-                    if callable(default):
-                        df[col] = default(df)
-                    else:
-                        df[col] = default
-            
-            # Check for student skill data
-            skill_columns = [col for col in df.columns if 'score' in col.lower() or 'skill' in col.lower()]
-            has_student_data = len(skill_columns) > 0
-            
-            # If we have student data but no ID column, auto-create it
-            if has_student_data and not any(col.lower() in ['id', 'student_id'] for col in df.columns):
-                df['id'] = list(range(1, len(df) + 1))
-                
-            # Show a success message
-            st.success("✅ CSV data processed successfully. Added any missing columns with default values.")
-            
-            # Process the first row of optimization data
-            row = optimization_df.iloc[0]
-            
-            # Make sure we have subject names
-            if not isinstance(row['subject_names'], str) or not row['subject_names'].strip():
-                # If empty or not a string, set a default value
-                optimization_df.at[0, 'subject_names'] = 'Math,Science,History,English,Art'
-                row = optimization_df.iloc[0]  # Refresh row data
-            
-            # Extract subject information with extra safety checks
-            try:
-                subject_names = [s.strip() for s in str(row['subject_names']).split(',') if s.strip()]
-                # If we got an empty list, use defaults
-                if not subject_names:
-                    subject_names = ['Math', 'Science', 'History', 'English', 'Art']
-            except Exception:
-                # Fallback to defaults if any error occurs
-                subject_names = ['Math', 'Science', 'History', 'English', 'Art']
-            
-            # Handle subject difficulties with safety checks
-            try:
-                difficulty_str = str(row['subject_difficulties'])
-                # Try to parse difficulties, handling non-numeric values
-                subject_difficulties_list = []
-                for d in difficulty_str.split(','):
-                    try:
-                        subject_difficulties_list.append(int(d.strip()))
-                    except ValueError:
-                        # Use default medium difficulty (5) for non-numeric values
-                        subject_difficulties_list.append(5)
-                
-                # If we got an empty list, use defaults
-                if not subject_difficulties_list:
-                    subject_difficulties_list = [7, 6, 5, 4, 3]
-            except Exception:
-                # Fallback to defaults if any error occurs
-                subject_difficulties_list = [7, 6, 5, 4, 3]
-            
-            # Handle teacher distribution with safety checks
-            try:
-                distribution_str = str(row['teacher_distribution'])
-                # Try to parse teacher distribution, handling non-numeric values
-                teacher_distribution_raw = distribution_str.split(',')
-                teacher_distribution_list = []
-            except Exception:
-                # Fallback to defaults if any error occurs
-                teacher_distribution_raw = ['30', '25', '20', '15', '10']
-                teacher_distribution_list = []
-            
-            # Make sure teacher_distribution matches the number of subjects
-            if len(teacher_distribution_raw) != len(subject_names):
-                st.warning(f"⚠️ Teacher distribution count ({len(teacher_distribution_raw)}) doesn't match subject count ({len(subject_names)}). Adjusting distributions.")
-                # Create equal distribution
-                equal_value = 100.0 / len(subject_names)
-                teacher_distribution_list = [equal_value for _ in subject_names]
-            else:
-                teacher_distribution_list = [float(d.strip()) for d in teacher_distribution_raw]
-            
-            # Check that difficulties list matches subjects
-            if len(subject_difficulties_list) != len(subject_names):
-                st.warning(f"⚠️ Subject difficulties count ({len(subject_difficulties_list)}) doesn't match subject count ({len(subject_names)}). Adjusting difficulties.")
-                # Extend or truncate the difficulties list
-                if len(subject_difficulties_list) < len(subject_names):
-                    # Add default medium difficulty (5) for missing subjects
-                    subject_difficulties_list.extend([5] * (len(subject_names) - len(subject_difficulties_list)))
-                else:
-                    # Truncate extra difficulties
-                    subject_difficulties_list = subject_difficulties_list[:len(subject_names)]
-            
-            # Create dictionaries
-            subject_difficulties = {subject: diff for subject, diff in zip(subject_names, subject_difficulties_list)}
-            teacher_distribution = {subject: dist for subject, dist in zip(subject_names, teacher_distribution_list)}
-            
-            # Normalize teacher distribution if needed
-            total_percentage = sum(teacher_distribution.values())
-            if total_percentage != 100:
-                for subject in teacher_distribution:
-                    teacher_distribution[subject] = (teacher_distribution[subject] / total_percentage) * 100
+            for level, message in parsed['messages']:
+                getattr(st, level)(message)
             
-            # Get optional parameters with defaults
-            ideal_ratio = row.get('ideal_ratio', 15)
-            max_class_size = row.get('max_class_size', 30)
-            prioritize_experience = row.get('prioritize_experience', True)
-            
-            # Create input data dictionary - always use 2000 students
-            input_data = {
-                'institution_name': row['institution_name'],
-                'total_students': 2000,  # Always use 2000 regardless of what's in the file
-                'total_teachers': int(row['total_teachers']),
-                'num_classrooms': int(row['num_classrooms']),
-                'min_students_per_teacher': 5,  # Default value
-                'max_students_per_teacher': 25,  # Default value
-                'ideal_ratio': ideal_ratio,
-                'max_class_size': max_class_size,
-                'subject_names': subject_names,
-                'subject_difficulties': subject_difficulties,
-                'teacher_distribution': teacher_distribution,
-                'prioritize_experience': prioritize_experience
-            }
+            if parsed['missing_required']:
+                st.error(f"⚠️ Missing mandatory columns: {', '.join(parsed['missing_required'])}. These are required for processing.")
+                st.info("Please add these columns to your CSV file and try again.")
+                st.stop()
             
-            # Calculate current ratio - always use 2000 students
-            current_overall = 2000.0 / float(row['total_teachers'])
+            input_data = parsed['input_data']
+            current_ratios = parsed['current_ratios']
+            skill_columns = parsed['skill_columns']
+            has_student_data = parsed['has_student_data']
             
-            current_ratios = {
-                'overall': current_overall,
-                'by_subject': {subject: current_overall for subject in subject_names}
-            }
-            
-            # Check for student skill data
-            skill_columns = [col for col in df.columns if 'score' in col.lower() or 'skill' in col.lower()]
-            has_student_data = 'id' in df.columns.str.lower() and len(skill_columns) > 0
+            # Store student data for later use
+            if parsed['student_data_detected']:
+                st.session_state.student_data = df
             
             if has_student_data:
                 st.success("✅ Student skill data detected! We'll use this for optimal classroom assignments.")
@@ -1194,15 +1430,19 @@ def show_csv_upload_page():
                 
                 # Create skill distribution charts
                 for skill_col in skill_columns:
-                    # Create histogram for skill distribution
-                    fig = px.histogram(
-                        df, 
-                        x=skill_col,
-                        nbins=10,
-                        title=f"Distribution of {skill_col.replace('_', ' ').title()}",
-                        labels={skill_col: skill_col.replace('_', ' ').title(), 'count': 'Number of Students'},
-                        color_discrete_sequence=['indianred']
-                    )
+                    # Create histogram for skill distribution, pre-binned for numeric scores
+                    if pd.api.types.is_numeric_dtype(df[skill_col]):
+                        fig = cached_skill_histogram(skill_col, df[skill_col].to_numpy(dtype=np.float64))
+                    else:
+                        import plotly.express as px
+                        fig = px.histogram(
+                            df, 
+                            x=skill_col,
+                            nbins=10,
+                            title=f"Distribution of {skill_col.replace('_', ' ').title()}",
+                            labels={skill_col: skill_col.replace('_', ' ').title(), 'count': 'Number of Students'},
+                            color_discrete_sequence=['indianred']
+                        )
                     st.plotly_chart(fig, use_container_width=True)
                 
                 # Store student data in session state
@@ -1216,7 +1456,7 @@ def show_csv_upload_page():
                     st.session_state.current_ratios = current_ratios
                     
                     # Run optimization
-                    optimization_result = optimize_teacher_allocation(input_data)
+                    optimization_result = cached_optimize_teacher_allocation(input_data)
                     
                     # If we have student data, add classroom assignments based on skills
                     if has_student_data:
@@ -1230,6 +1470,13 @@ def show_csv_upload_page():
         
         except Exception as e:
             try:
+                # If parsing failed part-way, re-read the raw rows for the fallback
+                if 'df' not in locals():
+                    try:
+                        df = pd.read_csv(io.BytesIO(uploaded_file.getvalue()))
+                    except Exception:
+                        df = None
+
                 # Initialize skill_columns if needed
                 if 'skill_columns' not in locals():
                     # Detect any skill-related columns
@@ -1263,7 +1510,7 @@ def show_csv_upload_page():
                         st.success(f"📊 Detected student data with {len(df)} students. We'll use this for optimization.")
                 
                 # Process our corrected dataframe
-                row = df.iloc[0]
+                row = df.iloc[0].to_dict()
                 
                 # Create a basic input data dictionary
                 input_data = {
@@ -1290,7 +1537,7 @@ def show_csv_upload_page():
                 
                 current_ratios = {
                     'overall': current_overall,
-                    'by_subject': {subject: current_overall for subject in input_data['subject_names']}
+                    'by_subject': dict.fromkeys(input_data['subject_names'], current_overall)
                 }
                 
                 # Store in session state
@@ -1298,7 +1545,7 @@ def show_csv_upload_page():
                 st.session_state.current_ratios = current_ratios
                 
                 # Run optimization
-                optimization_result = optimize_teacher_allocation(input_data)
+                optimization_result = cached_optimize_teacher_allocation(input_data)
                 
                 # If we have student data, add classroom assignments based on skills
                 if student_data_detected:
@@ -1317,9 +1564,49 @@ def show_csv_upload_page():
                 st.expander("🛠️ Error details for troubleshooting").write(str(inner_e))
                 st.stop()
 
-def add_student_skill_based_assignments(optimization_result, student_df, skill_columns, custom_groups=None):
+# Student skill levels, indexed by the codes from compute_skill_percentiles
+SKILL_LEVEL_LABELS = np.array(['Beginner', 'Intermediate', 'Advanced'])
+
+def compute_skill_percentiles(skill_values):
     """
-    Add classroom assignments for students based on their skills.
+    Computes each student's percentile within every skill and buckets it into
+    a skill level.
+    
+    Args:
+        skill_values: Array of shape (students, skills) with the skill scores
+    
+    Returns:
+        Tuple of (percentiles, level_codes), both shaped like skill_values.
+        A percentile is the share of students scoring at or below the student;
+        level codes are 0 (<= 33rd percentile), 1 (<= 66th) or 2 (above).
+        Missing scores get percentile 0.
+    """
+    num_students = skill_values.shape[0]
+    percentiles = np.zeros(skill_values.shape)
+    level_codes = np.zeros(skill_values.shape, dtype=np.int8)
+    
+    if num_students > 1:  # Avoid division by zero
+        # Sort every skill column once, then binary-search the scores in it
+        sorted_values = np.sort(skill_values, axis=0)
+        for j in range(skill_values.shape[1]):
+            percentiles[:, j] = np.searchsorted(sorted_values[:, j], skill_values[:, j], side='right')
+        percentiles = percentiles / num_students * 100
+        percentiles[np.isnan(skill_values)] = 0
+        
+        # Levels only need two cut-off scores per skill: the sorted score at the
+        # first rank whose percentile exceeds the limit. Students scoring at or
+        # above a cut-off move up one level.
+        rank_percentiles = np.arange(num_students + 1) / num_students * 100
+        for limit in (33, 66):
+            cutoff = sorted_values[np.count_nonzero(rank_percentiles <= limit) - 1]
+            level_codes += skill_values >= cutoff
+    
+    return percentiles, level_codes
+
+def compute_student_skill_assignments(optimization_result, student_df, skill_columns, custom_groups=None):
+    """
+    Compute skill-based student groups and assignments. Errors propagate to
+    the caller; see add_student_skill_based_assignments.
     
     Args:
         optimization_result: The original optimization result
@@ -1330,166 +1617,215 @@ def add_student_skill_based_assignments(optimization_result, student_df, skill_c
     Returns:
         Updated optimization result with student assignments
     """
-    try:
-        # If no student data provided, return original result
-        if student_df is None or len(student_df) == 0 or not skill_columns:
-            return optimization_result
-        
-        # Create a copy of the optimization result
-        result = optimization_result.copy() if optimization_result else {}
-        
-        # Calculate the number of groups to use
-        if custom_groups and custom_groups > 0:
-            # Use custom number of groups
-            num_groups = min(custom_groups, len(student_df))  # Can't have more groups than students
-        elif 'classroom_allocation' in result:
-            # Use number of classrooms from optimization
-            num_groups = len(result['classroom_allocation'])
-        else:
-            # Default to 3 groups if no classroom data
-            num_groups = 3
-        
-        # Calculate composite skill scores
+    # If no student data provided, return original result
+    if student_df is None or len(student_df) == 0 or not skill_columns:
+        return optimization_result
+    
+    # Create a copy of the optimization result
+    result = optimization_result.copy() if optimization_result else {}
+    num_students = len(student_df)
+    
+    # Calculate the number of groups to use
+    if custom_groups and custom_groups > 0:
+        # Use custom number of groups
+        num_groups = min(custom_groups, num_students)  # Can't have more groups than students
+    elif 'classroom_allocation' in result:
+        # Use number of classrooms from optimization
+        num_groups = len(result['classroom_allocation'])
+    else:
+        # Default to 3 groups if no classroom data
+        num_groups = 3
+    
+    # Calculate composite skill scores, copying the roster only when adding the column
+    if not 'composite_skill' in student_df.columns:
         student_df = student_df.copy()
-        if not 'composite_skill' in student_df.columns:
-            # Create normalized composite skill score (0-10 scale)
-            student_df['composite_skill'] = student_df[skill_columns].mean(axis=1)
-            max_skill = student_df['composite_skill'].max()
-            min_skill = student_df['composite_skill'].min()
-            if max_skill > min_skill:  # Avoid division by zero
-                student_df['composite_skill'] = (student_df['composite_skill'] - min_skill) / (max_skill - min_skill) * 10
-            else:
-                student_df['composite_skill'] = 5  # Default middle value if all scores are the same
-        
-        # Sort students by composite skill score
-        sorted_students = student_df.sort_values('composite_skill', ascending=False)
-        
-        # Divide students into groups based on skill level
-        students_per_group = len(sorted_students) // num_groups
-        remainder = len(sorted_students) % num_groups
-        
-        # Create group assignments
-        group_assignments = []
-        group_info = []
+        # Create normalized composite skill score (0-10 scale) on the raw
+        # arrays, averaging each student's available (non-missing) skills
+        skills = student_df[skill_columns].to_numpy(dtype=np.float64)
+        present = ~np.isnan(skills)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            composite = np.where(present, skills, 0).sum(axis=1) / present.sum(axis=1)
+        scored = composite[~np.isnan(composite)]
+        if scored.size and scored.max() > scored.min():  # Avoid division by zero
+            composite = (composite - scored.min()) / (scored.max() - scored.min()) * 10
+        else:
+            composite = np.full_like(composite, 5)  # Default middle value if all scores are the same
+        student_df['composite_skill'] = composite
+    
+    # Sort students by composite skill score, highest first with ties in roster order
+    order = np.argsort(-student_df['composite_skill'].to_numpy(dtype=np.float64), kind='stable')
+    sorted_students = student_df.iloc[order]
+    
+    # Divide students into groups based on skill level
+    students_per_group, remainder = divmod(num_students, num_groups)
+    
+    # Percentile and skill level of every student in every skill, computed for
+    # the whole roster at once. Rows line up with sorted_students.
+    percentile_matrix, level_codes = compute_skill_percentiles(
+        sorted_students[skill_columns].to_numpy(dtype=np.float64)
+    )
+    level_matrix = SKILL_LEVEL_LABELS[level_codes]
+    skill_percentiles = dict(zip(skill_columns, percentile_matrix.T.tolist()))
+    skill_levels = dict(zip(skill_columns, level_matrix.T.tolist()))
+    
+    # Per-group skill statistics in one grouped pass over the sorted rows,
+    # labelling each row with the index of the group it falls into
+    group_sizes = students_per_group + (np.arange(num_groups) < remainder)
+    row_groups = np.repeat(np.arange(num_groups), group_sizes)
+    group_stats = sorted_students[skill_columns].groupby(row_groups).agg(['mean', 'min', 'max']).round(2)
+    group_composite = sorted_students['composite_skill'].groupby(row_groups).mean().round(2)
+    
+    # Top skill of every group: the skill with the highest average
+    group_means = group_stats.xs('mean', axis=1, level=1).to_numpy(dtype=np.float64)
+    group_top_skill = pd.Series(
+        np.asarray(skill_columns, dtype=object)[np.nan_to_num(group_means, nan=-np.inf).argmax(axis=1)],
+        index=group_stats.index
+    )
+    
+    # Skill level label of every group by its position in the sorted order:
+    # the top third is Advanced, the middle third Intermediate, the rest Beginner
+    group_levels = np.array(['Advanced', 'Intermediate', 'Beginner'])[
+        np.digitize(np.arange(num_groups), [num_groups // 3, 2 * num_groups // 3])
+    ].tolist()
+    
+    # Create group information
+    group_info = []
+    
+    start_idx = 0
+    for group_idx in range(num_groups):
+        # Calculate number of students in this group
+        end_idx = start_idx + group_sizes[group_idx]
         
-        start_idx = 0
-        for group_idx in range(num_groups):
-            # Calculate number of students in this group
-            group_size = students_per_group + (1 if group_idx < remainder else 0)
-            end_idx = start_idx + group_size
+        # Get students for this group
+        if start_idx < num_students:
+            group_students = sorted_students.iloc[start_idx:end_idx]
+            
+            # Create group skill profile
+            group_skills = {}
+            for skill in skill_columns:
+                group_skills[skill] = {
+                    'avg': group_stats[(skill, 'mean')][group_idx],
+                    'min': group_stats[(skill, 'min')][group_idx],
+                    'max': group_stats[(skill, 'max')][group_idx]
+                }
             
-            # Get students for this group
-            if start_idx < len(sorted_students):
-                group_students = sorted_students.iloc[start_idx:end_idx]
-                
-                # Create group skill profile
-                group_skills = {}
-                for skill in skill_columns:
-                    skill_values = group_students[skill]
-                    group_skills[skill] = {
-                        'avg': round(skill_values.mean(), 2),
-                        'min': round(skill_values.min(), 2),
-                        'max': round(skill_values.max(), 2)
-                    }
-                
-                # Determine top skill for the group
-                avg_skills = {skill: group_skills[skill]['avg'] for skill in skill_columns}
-                top_skill = max(avg_skills.items(), key=lambda x: x[1])[0] if avg_skills else None
-                
-                # Determine skill level label based on position in sorted list
-                if group_idx < num_groups // 3:
-                    skill_level = "Advanced"
-                elif group_idx < 2 * num_groups // 3:
-                    skill_level = "Intermediate"
-                else:
-                    skill_level = "Beginner"
-                
-                # Create group information
-                group_data = {
-                    'group_id': group_idx + 1,
-                    'group_name': f"Group {group_idx + 1}",
-                    'skill_level': skill_level,
-                    'size': len(group_students),
-                    'avg_composite_skill': round(group_students['composite_skill'].mean(), 2),
-                    'skill_profile': group_skills,
-                    'top_skill': top_skill,
-                    'student_count': len(group_students)
+            # Determine top skill for the group
+            top_skill = group_top_skill[group_idx]
+            
+            # Determine skill level label based on position in sorted list
+            skill_level = group_levels[group_idx]
+            
+            # Create group information
+            group_data = {
+                'group_id': group_idx + 1,
+                'group_name': f"Group {group_idx + 1}",
+                'skill_level': skill_level,
+                'size': len(group_students),
+                'avg_composite_skill': group_composite[group_idx],
+                'skill_profile': group_skills,
+                'top_skill': top_skill,
+                'student_count': len(group_students)
+            }
+            
+            # Add group info
+            group_info.append(group_data)
+            
+            start_idx = end_idx
+    
+    # Create student assignments from whole columns in sorted order, falling
+    # back to the row label when there is no id column
+    student_ids = (sorted_students['id'] if 'id' in sorted_students.columns else sorted_students.index).tolist()
+    if 'name' in sorted_students.columns:
+        student_names = sorted_students['name'].tolist()
+    else:
+        student_names = [f"Student {student_id}" for student_id in student_ids]
+    composite_skills = [round(skill, 2) for skill in sorted_students['composite_skill'].tolist()]
+    skill_values = {skill: sorted_students[skill].tolist() for skill in skill_columns}
+    
+    group_assignments = [
+        {
+            'student_id': student_id,
+            'student_name': student_name,
+            'group_id': group_idx + 1,
+            'group_name': f"Group {group_idx + 1}",
+            'composite_skill': composite_skill,
+            'skills': {
+                skill: {
+                    'value': skill_values[skill][position],
+                    'level': skill_levels[skill][position],
+                    'percentile': round(skill_percentiles[skill][position])
                 }
-                
-                # Add group info
-                group_info.append(group_data)
-                
-                # Create student assignments
-                for _, student in group_students.iterrows():
-                    # Get student ID and name
-                    student_id = student.get('id', student.name if hasattr(student, 'name') else 'Unknown')
-                    student_name = student.get('name', f"Student {student_id}")
-                    
-                    # Create student skill profile
-                    student_skill_profile = {}
-                    for skill in skill_columns:
-                        # Determine skill level relative to all students
-                        value = student[skill]
-                        percentile = 0
-                        if len(student_df) > 1:  # Avoid division by zero
-                            percentile = len(student_df[student_df[skill] <= value]) / len(student_df) * 100
-                        
-                        if percentile <= 33:
-                            level = 'Beginner'
-                        elif percentile <= 66:
-                            level = 'Intermediate'
-                        else:
-                            level = 'Advanced'
-                        
-                        student_skill_profile[skill] = {
-                            'value': value,
-                            'level': level,
-                            'percentile': round(percentile)
-                        }
-                    
-                    # Add assignment
-                    group_assignments.append({
-                        'student_id': student_id,
-                        'student_name': student_name,
-                        'group_id': group_idx + 1,
-                        'group_name': f"Group {group_idx + 1}",
-                        'composite_skill': round(student['composite_skill'], 2),
-                        'skills': student_skill_profile
-                    })
-                
-                start_idx = end_idx
-        
-        # Add group information to result
-        result['skill_based_distribution'] = group_info
-        result['student_group_assignments'] = group_assignments
-        result['custom_grouping'] = custom_groups is not None
-        result['num_skill_groups'] = num_groups
-        
-        # Add skill group analysis
-        group_avg_skills = [g['avg_composite_skill'] for g in group_info]
-        group_sizes = [g['size'] for g in group_info]
-        skill_ranges = []
-        for g in group_info:
-            if 'skill_profile' in g and g['top_skill'] in g['skill_profile']:
-                skill_profile = g['skill_profile'][g['top_skill']]
-                skill_ranges.append(skill_profile['max'] - skill_profile['min'])
-            else:
-                skill_ranges.append(0)
-        
-        result['skill_group_analysis'] = {
-            'num_groups': num_groups,
-            'total_students': len(student_df),
-            'avg_group_size': round(len(student_df) / num_groups, 1),
-            'group_homogeneity': round(1 - (sum(skill_ranges) / max(1, len(skill_ranges)) / 10), 2),  # 0-1 scale
-            'between_group_variance': round(np.var(group_avg_skills) if len(group_avg_skills) > 1 else 0, 2)
+                for skill in skill_columns
+            }
         }
-        
-        return result
+        for position, (student_id, student_name, group_idx, composite_skill) in enumerate(
+            zip(student_ids, student_names, row_groups.tolist(), composite_skills)
+        )
+    ]
+    
+    # Add group information to result
+    result['skill_based_distribution'] = group_info
+    result['student_group_assignments'] = group_assignments
+    result['custom_grouping'] = custom_groups is not None
+    result['num_skill_groups'] = num_groups
+    
+    # Add skill group analysis
+    group_avg_skills = [g['avg_composite_skill'] for g in group_info]
+    group_sizes = [g['size'] for g in group_info]
+    skill_ranges = []
+    for g in group_info:
+        if 'skill_profile' in g and g['top_skill'] in g['skill_profile']:
+            skill_profile = g['skill_profile'][g['top_skill']]
+            skill_ranges.append(skill_profile['max'] - skill_profile['min'])
+        else:
+            skill_ranges.append(0)
+    
+    result['skill_group_analysis'] = {
+        'num_groups': num_groups,
+        'total_students': num_students,
+        'avg_group_size': round(num_students / num_groups, 1),
+        'group_homogeneity': round(1 - (sum(skill_ranges) / max(1, len(skill_ranges)) / 10), 2),  # 0-1 scale
+        'between_group_variance': round(np.var(group_avg_skills) if len(group_avg_skills) > 1 else 0, 2)
+    }
+    
+    return result
+
+def add_student_skill_based_assignments(optimization_result, student_df, skill_columns, custom_groups=None):
+    """
+    Add classroom assignments for students based on their skills.
+    
+    Args:
+        optimization_result: The original optimization result
+        student_df: DataFrame containing student data
+        skill_columns: List of columns containing skill scores
+        custom_groups: Optional number of custom groups to create (overrides classroom-based grouping)
+    
+    Returns:
+        Updated optimization result with student assignments
+    """
+    try:
+        return compute_student_skill_assignments(optimization_result, student_df, skill_columns, custom_groups)
     except Exception as e:
         # If anything goes wrong, return the original result
         print(f"Error in skill-based assignment: {str(e)}")
         return optimization_result
 
+# Color scale for the groups in the skill radar chart, to make them visually
+# distinct, and the matching translucent fill colors
+GROUP_RADAR_COLORS = (
+    'rgba(31, 119, 180, 0.8)',    # Blue
+    'rgba(255, 127, 14, 0.8)',    # Orange
+    'rgba(44, 160, 44, 0.8)',     # Green
+    'rgba(214, 39, 40, 0.8)',     # Red
+    'rgba(148, 103, 189, 0.8)',   # Purple
+    'rgba(140, 86, 75, 0.8)',     # Brown
+    'rgba(227, 119, 194, 0.8)',   # Pink
+    'rgba(127, 127, 127, 0.8)',   # Gray
+    'rgba(188, 189, 34, 0.8)',    # Olive
+    'rgba(23, 190, 207, 0.8)'     # Teal
+)
+GROUP_RADAR_FILL_COLORS = tuple(color.replace('0.8', '0.3') for color in GROUP_RADAR_COLORS)
+
 def create_student_group_analysis_chart(optimization_result):
     """
     Creates a visualization of student group analysis based on skill distribution.
@@ -1500,6 +1836,9 @@ def create_student_group_analysis_chart(optimization_result):
     Returns:
         Plotly figure object or dictionary of figures
     """
+    import plotly.express as px
+    import plotly.graph_objects as go
+    
     try:
         if not optimization_result or 'skill_based_distribution' not in optimization_result:
             # Return empty chart with message
@@ -1519,22 +1858,14 @@ def create_student_group_analysis_chart(optimization_result):
         
         groups = optimization_result['skill_based_distribution']
         
-        # Extract data for visualization
-        group_ids = [g['group_id'] for g in groups]
-        group_names = [g['group_name'] for g in groups]
-        avg_skills = [g['avg_composite_skill'] for g in groups]
-        sizes = [g['size'] for g in groups]
-        top_skills = [g.get('top_skill', 'Unknown') for g in groups]
-        skill_levels = [g.get('skill_level', 'Unknown') for g in groups]
-        
-        # Create color mapping for skill levels
-        color_map = {
-            'Advanced': 'rgba(0, 200, 0, 0.7)',      # Green
-            'Intermediate': 'rgba(200, 200, 0, 0.7)', # Yellow
-            'Beginner': 'rgba(200, 0, 0, 0.7)'       # Red
-        }
-        
-        colors = [color_map.get(level, 'rgba(100, 100, 100, 0.7)') for level in skill_levels]
+        # Materialize the groups once as a frame and read whole columns from it
+        group_frame = pd.DataFrame.from_records(
+            groups, columns=['group_id', 'group_name', 'avg_composite_skill', 'size', 'top_skill', 'skill_level']
+        ).fillna({'top_skill': 'Unknown', 'skill_level': 'Unknown'})
+        group_names = group_frame['group_name']
+        avg_skills = group_frame['avg_composite_skill']
+        sizes = group_frame['size']
+        skill_levels = group_frame['skill_level']
         
         # Create main visualization - grouped bar chart
         fig1 = go.Figure()
@@ -1600,45 +1931,31 @@ def create_student_group_analysis_chart(optimization_result):
         
         if skill_data and all_skills:
             # Create radar/polar chart for skill comparison
-            # Define a color scale for the groups to make them visually distinct
-            colors = [
-                'rgba(31, 119, 180, 0.8)',    # Blue
-                'rgba(255, 127, 14, 0.8)',    # Orange
-                'rgba(44, 160, 44, 0.8)',     # Green
-                'rgba(214, 39, 40, 0.8)',     # Red
-                'rgba(148, 103, 189, 0.8)',   # Purple
-                'rgba(140, 86, 75, 0.8)',     # Brown
-                'rgba(227, 119, 194, 0.8)',   # Pink
-                'rgba(127, 127, 127, 0.8)',   # Gray
-                'rgba(188, 189, 34, 0.8)',    # Olive
-                'rgba(23, 190, 207, 0.8)'     # Teal
-            ]
-            
             # Sort skill_data by group_id to ensure consistent group colors
             skill_data = sorted(skill_data, key=lambda x: x['group_id'])
             
             # Get a list of skill categories for the radar chart
             skill_categories = sorted(list(all_skills))
             
-            # Create radar chart traces for each group
+            # Average of every skill for every group as one (groups, skills) matrix,
+            # with 0 for skills missing from a group's profile
+            skill_matrix = np.zeros((len(skill_data), len(skill_categories)))
             for i, data in enumerate(skill_data):
-                values = []
-                for skill in skill_categories:
+                for j, skill in enumerate(skill_categories):
                     if skill in data['profile']:
-                        values.append(data['profile'][skill]['avg'])
-                    else:
-                        values.append(0)
-                
-                # Add the first value again at the end to close the shape
-                color_idx = i % len(colors)
+                        skill_matrix[i, j] = data['profile'][skill]['avg']
+            
+            # Create radar chart traces for each group
+            for i, data in enumerate(skill_data):
+                color_idx = i % len(GROUP_RADAR_COLORS)
                 
                 fig2.add_trace(go.Scatterpolar(
-                    r=values,
+                    r=skill_matrix[i].tolist(),
                     theta=skill_categories,
                     fill='toself',
                     name=data['group'],
-                    line=dict(color=colors[color_idx]),
-                    fillcolor=colors[color_idx].replace('0.8', '0.3'),
+                    line=dict(color=GROUP_RADAR_COLORS[color_idx]),
+                    fillcolor=GROUP_RADAR_FILL_COLORS[color_idx],
                     opacity=0.9
                 ))
             
@@ -1710,16 +2027,10 @@ def create_student_group_analysis_chart(optimization_result):
             #### Distribution by Skill Level:
             """
             
-            # Add count by skill level
-            level_counts = {}
-            for level in skill_levels:
-                if level in level_counts:
-                    level_counts[level] += 1
-                else:
-                    level_counts[level] = 1
-                    
-            for level, count in level_counts.items():
-                summary += f"\n- **{level}:** {count} groups"
+            # Add count by skill level, listing levels in the order they first appear
+            levels, first_seen, counts = np.unique(skill_levels, return_index=True, return_counts=True)
+            for i in np.argsort(first_seen):
+                summary += f"\n- **{levels[i]}:** {counts[i]} groups"
                 
         else:
             summary = "### Student Group Analysis Summary\n\nGroup analysis based on student skill levels."
@@ -1746,6 +2057,49 @@ def create_student_group_analysis_chart(optimization_result):
         )
         return {'main_chart': fig, 'skill_chart': fig, 'summary': f"Error: {str(e)}"}
 
+GENAI_MODEL_NAMES = (
+    ('gemini-1.5-pro', "✅ Successfully connected to Google Gemini 1.5 Pro model!"),
+    ('gemini-1.0-pro', "✅ Successfully connected to Google Gemini 1.0 Pro model!"),
+    ('gemini-pro', "✅ Connected to Google Gemini Pro model!"),
+)
+
+def configure_genai(api_key):
+    """
+    Point the Google Generative AI client at an API key.
+    
+    The client configuration is process-wide and shared by every session, so
+    this is called right before each request with the requesting session's key.
+    
+    Args:
+        api_key: Google API key to configure the client with
+    """
+    # Imported here so the gRPC/protobuf stack only loads when the chatbot is used
+    import google.generativeai as genai
+    
+    genai.configure(api_key=api_key)
+
+def create_genai_model(api_key):
+    """
+    Configure the Google Generative AI client and create the chat model.
+    
+    Args:
+        api_key: Google API key to configure the client with
+    
+    Returns:
+        Tuple of (model, success message) for the first model name that works
+    """
+    import google.generativeai as genai
+    
+    configure_genai(api_key)
+    
+    # Try different model names in order of preference
+    for model_name, message in GENAI_MODEL_NAMES:
+        try:
+            return genai.GenerativeModel(model_name), message
+        except Exception as model_error:
+            last_error = model_error
+    raise LookupError(str(last_error))
+
 def setup_genai():
     """Set up the Google Generative AI client"""
     api_key = os.getenv("GOOGLE_API_KEY")
@@ -1771,37 +2125,65 @@ def setup_genai():
             st.info("ℹ️ The AI assistant requires a valid Google API key to function.")
             return None
     
-    try:
-        # Configure the API
-        genai.configure(api_key=api_key)
-        
-        # Store API key in session state for persistence during this session
-        st.session_state.google_api_key = api_key
-        
-        # Try different model names in order of preference
+    # Reuse this session's model across reruns while its API key is unchanged
+    genai_model = st.session_state.get('genai_model')
+    if genai_model is not None and genai_model[0] == api_key:
+        _, model, message = genai_model
+    else:
         try:
-            model = genai.GenerativeModel('gemini-1.5-pro')
-            st.success("✅ Successfully connected to Google Gemini 1.5 Pro model!")
-            return model
-        except:
-            try:
-                model = genai.GenerativeModel('gemini-1.0-pro')
-                st.success("✅ Successfully connected to Google Gemini 1.0 Pro model!")
-                return model
-            except:
-                try:
-                    model = genai.GenerativeModel('gemini-pro')
-                    st.success("✅ Connected to Google Gemini Pro model!")
-                    return model
-                except Exception as model_error:
-                    st.error(f"❌ Error selecting Gemini model: {str(model_error)}")
-                    st.info("Please check if your API key has access to the Gemini models.")
-                    return None
-                
-    except Exception as e:
-        st.error(f"❌ Error setting up Google GenerativeAI: {str(e)}")
-        st.info("Please make sure you've entered a valid Google API key.")
-        return None
+            model, message = create_genai_model(api_key)
+        except LookupError as model_error:
+            st.error(f"❌ Error selecting Gemini model: {str(model_error)}")
+            st.info("Please check if your API key has access to the Gemini models.")
+            return None
+        except Exception as e:
+            st.error(f"❌ Error setting up Google GenerativeAI: {str(e)}")
+            st.info("Please make sure you've entered a valid Google API key.")
+            return None
+        st.session_state.genai_model = (api_key, model, message)
+    
+    # Store API key in session state for persistence during this session
+    st.session_state.google_api_key = api_key
+    st.success(message)
+    return model
+
+# Messages kept in the chat history; older turns are dropped so that the
+# history re-rendered on every rerun stays bounded
+CHAT_HISTORY_LIMIT = 50
+
+def build_chat_context(input_data, result, current_ratio):
+    """
+    Build the optimization context included in chatbot prompts.
+    
+    Args:
+        input_data: Input data used for the optimization
+        result: Optimization result
+        current_ratio: Current overall student-teacher ratio
+    
+    Returns:
+        Context string summarizing the optimization for the AI assistant
+    """
+    context = f"""
+        Context for the AI assistant:
+        - Institution: {input_data.get('institution_name', 'Unknown')}
+        - Total Students: {input_data.get('total_students', 0)}
+        - Total Teachers: {input_data.get('total_teachers', 0)}
+        - Optimal Ratio: {result.get('optimal_ratio', 0):.2f}:1
+        - Current Ratio: {current_ratio:.2f}:1
+        - Subject count: {len(input_data.get('subject_names', []))}
+        - Subjects: {', '.join(input_data.get('subject_names', []))}
+        """
+    
+    # Add skill-based distribution if available
+    if 'skill_based_distribution' in result:
+        context += "\n- Student skill distribution is available and has been incorporated into classroom assignments"
+    
+    # Add recommendations summary if available
+    if 'recommendations' in result and result['recommendations']:
+        top_rec = result['recommendations'][0]
+        context += f"\n- Top recommendation: {top_rec.get('title', 'N/A')}"
+    
+    return context
 
 def show_chatbot_page():
     st.title("🤖 AI Assistant")
@@ -1849,32 +2231,6 @@ def show_chatbot_page():
         with st.chat_message(role):
             st.markdown(message["content"])
     
-    # Get optimization context if available and enabled
-    context = ""
-    if st.session_state.optimization_result is not None and include_optimization:
-        input_data = st.session_state.input_data
-        result = st.session_state.optimization_result
-        
-        context = f"""
-        Context for the AI assistant:
-        - Institution: {input_data.get('institution_name', 'Unknown')}
-        - Total Students: {input_data.get('total_students', 0)}
-        - Total Teachers: {input_data.get('total_teachers', 0)}
-        - Optimal Ratio: {result.get('optimal_ratio', 0):.2f}:1
-        - Current Ratio: {st.session_state.current_ratios.get('overall', 0):.2f}:1
-        - Subject count: {len(input_data.get('subject_names', []))}
-        - Subjects: {', '.join(input_data.get('subject_names', []))}
-        """
-        
-        # Add skill-based distribution if available
-        if 'skill_based_distribution' in result:
-            context += "\n- Student skill distribution is available and has been incorporated into classroom assignments"
-        
-        # Add recommendations summary if available
-        if 'recommendations' in result and result['recommendations']:
-            top_rec = result['recommendations'][0]
-            context += f"\n- Top recommendation: {top_rec.get('title', 'N/A')}"
-    
     # Sample questions
     if not st.session_state.chat_history:
         st.info("👋 Welcome! Ask me any questions about student-teacher ratios, classroom optimization, or educational resource allocation.")
@@ -1906,6 +2262,16 @@ def show_chatbot_page():
         with st.chat_message("user"):
             st.markdown(user_input)
         
+        # Get optimization context if available and enabled, only when a
+        # question is actually sent
+        context = ""
+        if st.session_state.optimization_result is not None and include_optimization:
+            context = build_chat_context(
+                st.session_state.input_data,
+                st.session_state.optimization_result,
+                st.session_state.current_ratios.get('overall', 0)
+            )
+        
         # Generate AI response
         with st.chat_message("assistant"):
             message_placeholder = st.empty()
@@ -1926,11 +2292,17 @@ def show_chatbot_page():
                 Question: {user_input}
                 """
                 
-                # Get response from Google GenerativeAI
-                response = model.generate_content(prompt)
-                full_response = response.text
-                
-                # Remove loading message
+                # Stream the response from Google GenerativeAI, updating the
+                # placeholder as each chunk arrives
+                full_response = ""
+                configure_genai(st.session_state.google_api_key)
+                for chunk in model.generate_content(prompt, stream=True):
+                    # Remove loading message once the first chunk arrives
+                    loading_message.empty()
+                    full_response += chunk.text
+                    message_placeholder.markdown(full_response + "▌")
+                
+                # Remove loading message (the stream may have been empty)
                 loading_message.empty()
                 
                 # Display response
@@ -1947,6 +2319,21 @@ def show_chatbot_page():
                 message_placeholder.error(error_message)
                 message_placeholder.info("Please try asking a different question or check your API key.")
                 st.session_state.chat_history.append({"role": "assistant", "content": error_message})
+        
+        # Keep only the most recent messages
+        del st.session_state.chat_history[:-CHAT_HISTORY_LIMIT]
+
+# Page key -> page renderer, used by main() to dispatch
+PAGES = {
+    'input': show_input_page,
+    'csv_upload': show_csv_upload_page,
+    'ml_analysis': show_ml_analysis_page,
+    '3d_viz': show_3d_visualizations_page,
+    'results': show_results_page,
+    'recommendations': show_recommendations_page,
+    'reports': show_reports_page,
+    'chatbot': show_chatbot_page
+}
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,171 @@
 import os
+import re
+import copy
+import math
+import functools
+import csv
 import json
+import numpy as np
 import pandas as pd
 import datetime
 
+# orjson is used for scenario files when available; the standard library
+# json module is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Name column of each subject in exported scenario CSVs, e.g. subject_1_name
+SUBJECT_NAME_COLUMN = re.compile(r'^subject_(\d+)_name$')
+
+# Characters replaced with underscores when building filenames from names
+_SAFE_NAME_TABLE = str.maketrans({' ': '_', '/': '_', '\\': '_'})
+
+# Parsed scenario files keyed by filename, as (mtime, scenario data) pairs.
+# Kept in sync with the scenarios directory by _refresh_cache so that files
+# are only parsed again when they change on disk.
+_SCENARIO_CACHE = {}
+
+# Filenames of every cached version of each scenario, keyed by scenario name
+_NAME_TO_FILES = {}
+
+# Result of the last load_scenario call and the (file count, latest mtime)
+# signature of the directory it was computed from
+_last_signature = None
+_last_scenarios = None
+
 # Create scenarios directory if it doesn't exist
 def ensure_scenarios_dir():
     if not os.path.exists('scenarios'):
         os.makedirs('scenarios')
 
+@functools.lru_cache(maxsize=1024)
+def _safe_name(name):
+    """Filename-safe version of a scenario name"""
+    return name.translate(_SAFE_NAME_TABLE)
+
+def _json_compatible(obj):
+    """
+    Converts an object to plain JSON types, so that orjson and the standard
+    library json module serialize it to the same JSON values.
+    
+    Dictionary keys become strings the way json converts them, NumPy arrays
+    and scalars become Python values, and NaN and infinite floats become None.
+    
+    Args:
+        obj: Object to convert
+    
+    Returns:
+        The converted object
+    """
+    if isinstance(obj, dict):
+        return {_json_key(key): _json_compatible(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_compatible(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return _json_compatible(obj.tolist())
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+def _json_key(key):
+    """Converts a dictionary key to a string the way the json module does"""
+    if isinstance(key, np.generic):
+        key = key.item()
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, (bool, int, float)):
+        return json.dumps(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+
+def _dump_json(obj, indent=False):
+    """
+    Serializes an object to JSON bytes. The written values are the same
+    whether or not orjson is installed, see _json_compatible.
+    
+    Args:
+        obj: Object to serialize
+        indent: Whether to pretty-print with two-space indentation
+    
+    Returns:
+        UTF-8 encoded JSON
+    """
+    obj = _json_compatible(obj)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(
+        obj,
+        indent=2 if indent else None,
+        separators=(',', ': ') if indent else (',', ':'),
+        ensure_ascii=False,
+        allow_nan=False
+    ).encode('utf-8')
+
+def _load_json(raw):
+    """Parses JSON bytes"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _invalidate_last_scenarios():
+    """Forgets the memoized load_scenario result after a save or delete"""
+    global _last_signature
+    _last_signature = None
+
+def _cache_scenario(filename, mtime, scenario_data):
+    """Adds a parsed scenario file to the cache and the name index"""
+    _forget_scenario(filename)
+    _SCENARIO_CACHE[filename] = (mtime, scenario_data)
+    if isinstance(scenario_data, dict) and 'name' in scenario_data:
+        _NAME_TO_FILES.setdefault(scenario_data['name'], []).append(filename)
+
+def _forget_scenario(filename):
+    """Removes a scenario file from the cache and the name index"""
+    cached = _SCENARIO_CACHE.pop(filename, None)
+    if cached is None or not isinstance(cached[1], dict):
+        return
+    
+    filenames = _NAME_TO_FILES.get(cached[1].get('name'))
+    if filenames and filename in filenames:
+        filenames.remove(filename)
+        if not filenames:
+            del _NAME_TO_FILES[cached[1]['name']]
+
+def _refresh_cache():
+    """
+    Brings the scenario cache up to date with the scenarios directory,
+    parsing only new or modified files and dropping files that are gone.
+    
+    Returns:
+        The scenario cache
+    """
+    ensure_scenarios_dir()
+    
+    # Get all json files in the scenarios directory, reusing the stat
+    # information gathered while scanning it
+    with os.scandir('scenarios') as it:
+        entries = [e for e in it if e.is_file() and e.name.endswith('.json')]
+    
+    for entry in entries:
+        try:
+            mtime = entry.stat().st_mtime
+            cached = _SCENARIO_CACHE.get(entry.name)
+            if cached is not None and cached[0] == mtime:
+                continue
+            
+            with open(entry.path, 'rb') as f:
+                _cache_scenario(entry.name, mtime, _load_json(f.read()))
+        except Exception as e:
+            _forget_scenario(entry.name)
+            print(f"Error loading scenario {entry.name}: {e}")
+    
+    # Drop entries for files that no longer exist
+    for filename in _SCENARIO_CACHE.keys() - {e.name for e in entries}:
+        _forget_scenario(filename)
+    
+    return _SCENARIO_CACHE
+
 def save_scenario(name, data):
     """
     Saves a scenario to disk.
@@ -19,19 +177,26 @@ def save_scenario(name, data):
     ensure_scenarios_dir()
     
     # Generate a safe filename from the scenario name
-    safe_name = name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    safe_name = _safe_name(name)
     
     # Add timestamp for versioning
     timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     filename = f"{safe_name}_{timestamp}.json"
     
     # Save the data
-    with open(os.path.join('scenarios', filename), 'w') as f:
-        json.dump({
-            'name': name,
-            'data': data,
-            'timestamp': timestamp
-        }, f)
+    scenario_data = {
+        'name': name,
+        'data': data,
+        'timestamp': timestamp
+    }
+    path = os.path.join('scenarios', filename)
+    payload = _dump_json(scenario_data)
+    with open(path, 'wb') as f:
+        f.write(payload)
+    
+    # Cache what was written, parsed back so it matches a later read
+    _cache_scenario(filename, os.path.getmtime(path), _load_json(payload))
+    _invalidate_last_scenarios()
     
     return filename
 
@@ -40,40 +205,36 @@ def load_scenario():
     Loads all saved scenarios.
     
     Returns:
-        Dictionary containing all saved scenarios
+        Dictionary containing all saved scenarios. It is a copy, so callers
+        may modify it without affecting the cached scenarios.
     """
-    ensure_scenarios_dir()
-    scenarios = {}
+    global _last_signature, _last_scenarios
     
-    # Get all json files in the scenarios directory
-    files = [f for f in os.listdir('scenarios') if f.endswith('.json')]
+    # Reuse the last result while no file was added, removed or modified
+    cache = _refresh_cache()
+    signature = (len(cache), max((mtime for mtime, _ in cache.values()), default=None))
+    if signature == _last_signature:
+        return copy.deepcopy(_last_scenarios)
+    
+    scenarios = {}
     
-    # Group by scenario name (remove timestamp part)
-    scenario_groups = {}
+    # Saved timestamp of the latest version seen so far of each scenario
+    latest_timestamps = {}
     
-    for filename in files:
+    # Keep the latest version of each scenario in a single pass
+    for filename, (_, scenario_data) in cache.items():
         try:
-            with open(os.path.join('scenarios', filename), 'r') as f:
-                scenario_data = json.load(f)
-                name = scenario_data['name']
-                timestamp = scenario_data.get('timestamp', '')
-                
-                if name not in scenario_groups:
-                    scenario_groups[name] = []
-                
-                scenario_groups[name].append((timestamp, filename, scenario_data['data']))
+            name = scenario_data['name']
+            timestamp = scenario_data.get('timestamp', '')
+            
+            if name not in latest_timestamps or timestamp > latest_timestamps[name]:
+                latest_timestamps[name] = timestamp
+                scenarios[name] = scenario_data['data']
         except Exception as e:
             print(f"Error loading scenario {filename}: {e}")
     
-    # For each scenario, keep the latest version
-    for name, versions in scenario_groups.items():
-        # Sort by timestamp (descending)
-        sorted_versions = sorted(versions, key=lambda x: x[0], reverse=True)
-        # Keep the latest version
-        if sorted_versions:
-            scenarios[name] = sorted_versions[0][2]
-    
-    return scenarios
+    _last_signature, _last_scenarios = signature, scenarios
+    return copy.deepcopy(scenarios)
 
 def load_all_scenarios():
     """
@@ -82,24 +243,19 @@ def load_all_scenarios():
     Returns:
         Dictionary containing all saved scenarios
     """
-    ensure_scenarios_dir()
     scenarios = {}
     
-    # Get all json files in the scenarios directory
-    files = [f for f in os.listdir('scenarios') if f.endswith('.json')]
-    
-    for filename in files:
+    for filename, (mtime, scenario_data) in _refresh_cache().items():
         try:
-            with open(os.path.join('scenarios', filename), 'r') as f:
-                scenario_data = json.load(f)
-                name = scenario_data['name']
-                timestamp = scenario_data.get('timestamp', '')
-                
-                if name not in scenarios:
-                    scenarios[name] = {}
-                
-                version_name = f"{name} ({timestamp})"
-                scenarios[name][version_name] = scenario_data['data']
+            name = scenario_data['name']
+            timestamp = scenario_data.get('timestamp', '')
+            
+            if name not in scenarios:
+                scenarios[name] = {}
+            
+            # Copied so that callers can't modify the cached scenario
+            version_name = f"{name} ({timestamp})"
+            scenarios[name][version_name] = copy.deepcopy(scenario_data['data'])
         except Exception as e:
             print(f"Error loading scenario {filename}: {e}")
     
@@ -115,23 +271,21 @@ def delete_scenario(name):
     Returns:
         True if successful, False otherwise
     """
-    ensure_scenarios_dir()
+    _refresh_cache()
     
-    # Get all json files in the scenarios directory
-    files = [f for f in os.listdir('scenarios') if f.endswith('.json')]
-    
-    # Find files that match the scenario name
+    # Look up the files that match the scenario name
     deleted = False
-    for filename in files:
+    for filename in list(_NAME_TO_FILES.get(name, [])):
         try:
-            with open(os.path.join('scenarios', filename), 'r') as f:
-                scenario_data = json.load(f)
-                if scenario_data['name'] == name:
-                    os.remove(os.path.join('scenarios', filename))
-                    deleted = True
+            os.remove(os.path.join('scenarios', filename))
+            _forget_scenario(filename)
+            deleted = True
         except Exception as e:
             print(f"Error deleting scenario {filename}: {e}")
     
+    if deleted:
+        _invalidate_last_scenarios()
+    
     return deleted
 
 def export_scenario(name, format='json'):
@@ -157,17 +311,17 @@ def export_scenario(name, format='json'):
     
     if format.lower() == 'json':
         # Export as JSON
-        export_filename = f"export_{name.replace(' ', '_')}_{timestamp}.json"
+        export_filename = f"export_{_safe_name(name)}_{timestamp}.json"
         export_path = os.path.join('scenarios', export_filename)
         
-        with open(export_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        with open(export_path, 'wb') as f:
+            f.write(_dump_json(data, indent=True))
         
         return export_path
     
     elif format.lower() == 'csv':
         # Export as CSV (simplified)
-        export_filename = f"export_{name.replace(' ', '_')}_{timestamp}.csv"
+        export_filename = f"export_{_safe_name(name)}_{timestamp}.csv"
         export_path = os.path.join('scenarios', export_filename)
         
         # Convert the scenario data to a flat structure for CSV
@@ -184,9 +338,11 @@ def export_scenario(name, format='json'):
             flat_data[f'subject_{i+1}_difficulty'] = data.get('subject_difficulties', {}).get(subject, 0)
             flat_data[f'subject_{i+1}_teacher_percentage'] = data.get('teacher_distribution', {}).get(subject, 0)
         
-        # Create DataFrame and export
-        df = pd.DataFrame([flat_data])
-        df.to_csv(export_path, index=False)
+        # Write the header and the single data row
+        with open(export_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(flat_data.keys())
+            writer.writerow(flat_data.values())
         
         return export_path
     
@@ -209,8 +365,8 @@ def import_scenario(file_path):
         
         if filename.endswith('.json'):
             # Import JSON
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+            with open(file_path, 'rb') as f:
+                data = _load_json(f.read())
             
             # Extract scenario name from filename
             name_parts = filename.split('_')
@@ -238,28 +394,30 @@ def import_scenario(file_path):
             data['num_classrooms'] = int(df.get('num_classrooms', [0])[0])
             data['ideal_ratio'] = float(df.get('ideal_ratio', [0])[0])
             
-            # Extract subject data
-            subject_columns = [col for col in df.columns if col.startswith('subject_')]
+            # Extract subject data, finding the indices of all subjects present
+            # in a single pass over the columns
+            subject_ids = sorted(
+                int(match.group(1))
+                for match in map(SUBJECT_NAME_COLUMN.match, df.columns)
+                if match
+            )
             subject_names = []
             subject_difficulties = {}
             teacher_distribution = {}
             
-            for i in range(1, 100):  # Arbitrary upper limit
+            for i in subject_ids:
                 name_col = f'subject_{i}_name'
                 diff_col = f'subject_{i}_difficulty'
                 dist_col = f'subject_{i}_teacher_percentage'
                 
-                if name_col not in df.columns:
-                    break
-                
-                subject_name = df[name_col][0]
+                subject_name = df.at[0, name_col]
                 subject_names.append(subject_name)
                 
                 if diff_col in df.columns:
-                    subject_difficulties[subject_name] = float(df[diff_col][0])
+                    subject_difficulties[subject_name] = float(df.at[0, diff_col])
                 
                 if dist_col in df.columns:
-                    teacher_distribution[subject_name] = float(df[dist_col][0])
+                    teacher_distribution[subject_name] = float(df.at[0, dist_col])
             
             data['subject_names'] = subject_names
             data['subject_difficulties'] = subject_difficulties
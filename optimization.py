@@ -1,9 +1,8 @@
 import numpy as np
-from ortools.sat.python import cp_model
 
 def optimize_teacher_allocation(input_data):
     """
-    Optimizes teacher allocation based on input constraints using Google OR-Tools.
+    Optimizes teacher allocation based on input constraints.
     
     Args:
         input_data: Dictionary containing all input parameters
@@ -24,73 +23,72 @@ def optimize_teacher_allocation(input_data):
     teacher_distribution = input_data['teacher_distribution']
     prioritize_experience = input_data.get('prioritize_experience', True)
     
+    # Subject difficulties and the subjects from easiest to hardest, ties kept
+    # in input order, shared by the passes below
+    difficulty_subjects = list(subject_difficulties)
+    difficulties = np.fromiter(
+        subject_difficulties.values(), dtype=np.float64, count=len(difficulty_subjects)
+    )
+    easiest_order = np.argsort(difficulties, kind='stable')
+    
     # Calculate number of teachers per subject based on distribution
-    teachers_per_subject = {}
-    for subject, percentage in teacher_distribution.items():
-        teachers_per_subject[subject] = int(round((percentage / 100) * total_teachers))
-    
-    # Adjust to ensure we use exactly total_teachers
-    total_allocated = sum(teachers_per_subject.values())
-    if total_allocated < total_teachers:
-        # Allocate remaining teachers to subjects with highest difficulty
-        sorted_subjects = sorted(
-            subject_difficulties.items(),
-            key=lambda x: x[1],
-            reverse=True
+    subjects = list(teacher_distribution)
+    percentages = np.fromiter(teacher_distribution.values(), dtype=np.float64, count=len(subjects))
+    teacher_counts = np.rint(percentages / 100 * total_teachers).astype(np.int64)
+    
+    # Adjust to ensure we use exactly total_teachers, changing each subject by
+    # at most one teacher
+    shortfall = total_teachers - int(teacher_counts.sum())
+    if shortfall != 0:
+        # Positions of the subjects in order of difficulty, ties kept in input order
+        position = {subject: i for i, subject in enumerate(subjects)}
+        difficulty_positions = np.fromiter(
+            (position[subject] for subject in difficulty_subjects), dtype=np.int64, count=len(difficulty_subjects)
         )
-        for subject, _ in sorted_subjects:
-            if total_allocated >= total_teachers:
-                break
-            teachers_per_subject[subject] += 1
-            total_allocated += 1
-    
-    elif total_allocated > total_teachers:
-        # Remove teachers from subjects with lowest difficulty
-        sorted_subjects = sorted(
-            subject_difficulties.items(),
-            key=lambda x: x[1]
-        )
-        for subject, _ in sorted_subjects:
-            if total_allocated <= total_teachers:
-                break
-            if teachers_per_subject[subject] > 1:
-                teachers_per_subject[subject] -= 1
-                total_allocated -= 1
+        
+        if shortfall > 0:
+            # Allocate remaining teachers to subjects with highest difficulty
+            hardest_first = difficulty_positions[np.argsort(-difficulties, kind='stable')]
+            teacher_counts[hardest_first[:shortfall]] += 1
+        else:
+            # Remove teachers from subjects with lowest difficulty, keeping at least one
+            easiest_first = difficulty_positions[easiest_order]
+            removable = easiest_first[teacher_counts[easiest_first] > 1]
+            teacher_counts[removable[:-shortfall]] -= 1
+    
+    teachers_per_subject = dict(zip(subjects, teacher_counts.tolist()))
     
     # Calculate target students per subject based on a balanced approach
     # First calculate the ideal ratio for each subject based on difficulty
-    ideal_subject_ratios = {}
     avg_ratio = total_students / total_teachers if total_teachers > 0 else 15
     
-    for subject, difficulty in subject_difficulties.items():
-        # Scale based on difficulty (1-10): higher difficulty means lower ratio
-        difficulty_factor = max(0.6, min(1.4, (10 - difficulty) / 5))
-        # Apply factor to the average ratio (harder subjects = fewer students per teacher)
-        ideal_subject_ratios[subject] = avg_ratio * difficulty_factor
-    
-    # Calculate students per subject based on teacher allocation and the ideal ratios
-    students_per_subject = {}
-    remaining_students = total_students
-    
-    for subject, teachers in teachers_per_subject.items():
-        if teachers > 0:
-            # Calculate ideal student count for this subject based on teacher count and ideal ratio
-            ideal_students = int(round(teachers * ideal_subject_ratios[subject]))
-            # Enforce reasonable limits to avoid excessive imbalance
-            max_students_for_subject = int(total_students * 0.4)  # No subject should have more than 40% of students
-            students_per_subject[subject] = min(max_students_for_subject, ideal_students)
-        else:
-            # If no teachers for this subject, assign a minimal number of students
-            students_per_subject[subject] = 0
-        
-        remaining_students -= students_per_subject[subject]
+    # Scale based on difficulty (1-10): higher difficulty means lower ratio
+    difficulty_factors = np.clip((10 - difficulties) / 5, 0.6, 1.4)
+    # Apply factor to the average ratio (harder subjects = fewer students per teacher)
+    ideal_subject_ratios = dict(zip(difficulty_subjects, (avg_ratio * difficulty_factors).tolist()))
+    
+    # Calculate students per subject based on teacher allocation and the ideal ratios,
+    # for all subjects at once
+    has_teachers = teacher_counts > 0
+    subject_ratios = np.array([
+        ideal_subject_ratios[subject] if teachers else 0.0
+        for subject, teachers in zip(subjects, has_teachers.tolist())
+    ])
+    # Calculate ideal student count for each subject based on teacher count and ideal ratio
+    ideal_students = np.rint(teacher_counts * subject_ratios).astype(np.int64)
+    # Enforce reasonable limits to avoid excessive imbalance
+    max_students_for_subject = int(total_students * 0.4)  # No subject should have more than 40% of students
+    # If no teachers for a subject, assign a minimal number of students
+    subject_students = np.where(has_teachers, np.minimum(max_students_for_subject, ideal_students), 0)
+    
+    students_per_subject = dict(zip(subjects, subject_students.tolist()))
+    remaining_students = total_students - int(subject_students.sum())
     
     # Normalize to ensure we have exactly total_students allocated
     # Handle remaining students based on whether we need to add or remove
     
     # Distribute any remaining students (due to rounding)
-    sorted_subjects = sorted(subject_difficulties.items(), key=lambda x: x[1])
-    for subject, _ in sorted_subjects:
+    for subject in [difficulty_subjects[i] for i in easiest_order.tolist()]:
         if remaining_students == 0:
             break
         elif remaining_students > 0:
@@ -124,12 +122,18 @@ def optimize_teacher_allocation(input_data):
     teacher_allocation = []
     subject_allocation = {}
     
-    # Initialize subject allocation
-    for subject in subject_names:
+    # Initialize subject allocation, computing all subject ratios at once
+    subject_teachers = np.array([teachers_per_subject[subject] for subject in subject_names], dtype=np.int64)
+    subject_students = np.array([students_per_subject[subject] for subject in subject_names], dtype=np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        subject_ratios = subject_students / subject_teachers
+    for subject, teachers, students, ratio in zip(
+        subject_names, subject_teachers.tolist(), subject_students.tolist(), subject_ratios.tolist()
+    ):
         subject_allocation[subject] = {
-            'teachers_allocated': teachers_per_subject[subject],
-            'students_allocated': students_per_subject[subject],
-            'ratio': students_per_subject[subject] / teachers_per_subject[subject] if teachers_per_subject[subject] > 0 else 0
+            'teachers_allocated': teachers,
+            'students_allocated': students,
+            'ratio': ratio if teachers > 0 else 0
         }
     
     # Distribute teachers and students to classrooms with even distribution
@@ -150,102 +154,17 @@ def optimize_teacher_allocation(input_data):
     avg_students_per_classroom = total_students / num_classrooms
     max_size = min(avg_students_per_classroom * 1.2, max_class_size) if max_class_size > 0 else avg_students_per_classroom * 1.2
     
-    # First pass: calculate how many teachers per classroom for each subject
-    # But distribute them more evenly to avoid all in classroom 1
-    teachers_per_classroom_subject = {}
-    for subject, count in teachers_per_subject.items():
-        # Distribute teachers evenly across all classrooms
-        if count == 0:
-            continue
-            
-        # Calculate base and extras
-        base_teachers = count // num_classrooms
-        extra_teachers = count % num_classrooms
-        
-        teachers_per_classroom_subject[subject] = []
-        
-        # Shuffle the extra teachers a bit to avoid front-loading
-        extra_classrooms = list(range(num_classrooms))
-        # Simple shuffle - put more teachers in middle classrooms
-        if num_classrooms > 3:
-            extra_classrooms = list(range(1, num_classrooms-1)) + [0, num_classrooms-1]
-        
-        for i in range(num_classrooms):
-            # Assign base teachers to each classroom
-            teacher_count = base_teachers
-            # Distribute extras more evenly (not just to first N)
-            if i < extra_teachers and i in extra_classrooms[:extra_teachers]:
-                teacher_count += 1
-            teachers_per_classroom_subject[subject].append(teacher_count)
-    
-    # Second pass: calculate how many students per classroom for each subject
-    # Use a more even distribution to avoid all in classroom 1
-    students_per_classroom_subject = {}
-    
-    # First, distribute evenly regardless of subject
-    classroom_capacities = [max_size for _ in range(num_classrooms)]
+    # Spread each subject's teachers and students over the classrooms
+    teachers_per_classroom_subject, students_per_classroom_subject = split_classrooms_evenly(
+        teachers_per_subject, students_per_subject, num_classrooms, max_size
+    )
     
-    # Distribute by subject, but enforce classroom capacity
-    for subject, count in students_per_subject.items():
-        students_per_classroom_subject[subject] = [0] * num_classrooms
-        remaining_students = count
-        
-        # If we have teacher allocations for this subject, use them
-        if subject in teachers_per_classroom_subject and sum(teachers_per_classroom_subject[subject]) > 0:
-            teacher_counts = teachers_per_classroom_subject[subject]
-            total_teachers = sum(teacher_counts)
-            
-            # First round of allocation based on teacher counts
-            for i in range(num_classrooms):
-                if total_teachers == 0:
-                    student_count = 0
-                else:
-                    # Base allocation on teacher proportion but respect classroom capacity
-                    ideal_count = int(round((teacher_counts[i] / total_teachers) * count))
-                    # Ensure we don't exceed classroom capacity
-                    student_count = min(ideal_count, int(classroom_capacities[i]))
-                    # Ensure we don't exceed remaining students
-                    student_count = min(student_count, remaining_students)
-                
-                students_per_classroom_subject[subject][i] = student_count
-                classroom_capacities[i] -= student_count
-                remaining_students -= student_count
-            
-            # Distribute any remaining students to classrooms with capacity
-            if remaining_students > 0:
-                for i in range(num_classrooms):
-                    if classroom_capacities[i] > 0 and remaining_students > 0:
-                        # Add 1 student at a time to each classroom with capacity
-                        extra = min(classroom_capacities[i], remaining_students)
-                        students_per_classroom_subject[subject][i] += extra
-                        classroom_capacities[i] -= extra
-                        remaining_students -= extra
-        else:
-            # If no teachers for this subject, distribute evenly across classrooms
-            for i in range(num_classrooms):
-                if remaining_students <= 0:
-                    break
-                    
-                # Distribute evenly but respect capacity
-                even_share = remaining_students // (num_classrooms - i)
-                # Ensure we don't exceed classroom capacity
-                student_count = min(even_share, int(classroom_capacities[i]))
-                
-                students_per_classroom_subject[subject][i] = student_count
-                classroom_capacities[i] -= student_count
-                remaining_students -= student_count
-            
-            # Handle any remaining students
-            for i in range(num_classrooms):
-                if classroom_capacities[i] > 0 and remaining_students > 0:
-                    extra = min(classroom_capacities[i], remaining_students)
-                    students_per_classroom_subject[subject][i] += extra
-                    classroom_capacities[i] -= extra
-                    remaining_students -= extra
-    
-    # Update classroom allocations based on calculations
+    # Update classroom allocations based on calculations, collecting the
+    # (subject, classroom, teachers, students) blocks to split among teachers
+    teacher_blocks = []
     for i in range(num_classrooms):
         classroom = classroom_allocations[i]
+        placed_subjects = set()
         
         for subject in subject_names:
             if subject in teachers_per_classroom_subject:
@@ -256,42 +175,11 @@ def optimize_teacher_allocation(input_data):
                     # Add to classroom totals
                     classroom['teachers_assigned'] += teachers_to_allocate
                     classroom['students_assigned'] += students_to_allocate
-                    if subject not in classroom['subjects']:
+                    if subject not in placed_subjects:
+                        placed_subjects.add(subject)
                         classroom['subjects'].append(subject)
                     
-                    # Distribute students more evenly among teachers
-                    # Calculate the base number of students per teacher
-                    base_students_per_teacher = students_to_allocate // teachers_to_allocate if teachers_to_allocate > 0 else 0
-                    # Calculate how many teachers get an extra student
-                    extra_students = students_to_allocate % teachers_to_allocate if teachers_to_allocate > 0 else 0
-                    
-                    # Consider subject difficulty for distribution
-                    difficulty = subject_difficulties.get(subject, 5)
-                    
-                    # Add individual teacher allocations with better distribution
-                    for t_idx in range(teachers_to_allocate):
-                        # Higher difficulty subjects should have fewer students per teacher
-                        if t_idx < extra_students:
-                            students_for_this_teacher = base_students_per_teacher + 1
-                        else:
-                            students_for_this_teacher = base_students_per_teacher
-                            
-                        # Adjust based on subject difficulty - harder subjects get fewer students
-                        difficulty_factor = max(0.7, min(1.3, (10 - difficulty) / 5))
-                        adjusted_students = max(1, int(round(students_for_this_teacher * difficulty_factor)))
-                        
-                        # Ensure we don't exceed our target total
-                        if adjusted_students > students_for_this_teacher + 2:
-                            adjusted_students = students_for_this_teacher + 2
-                        if adjusted_students < students_for_this_teacher - 2:
-                            adjusted_students = students_for_this_teacher - 2
-                            
-                        teacher_allocation.append({
-                            'subject': subject,
-                            'students_assigned': adjusted_students,
-                            'classroom': f"Classroom {i+1}",
-                            'utilization': (adjusted_students / max_students_per_teacher) * 100 if max_students_per_teacher > 0 else 0
-                        })
+                    teacher_blocks.append((subject, i, teachers_to_allocate, students_to_allocate))
         
         # Calculate classroom ratio
         if classroom['teachers_assigned'] > 0:
@@ -299,6 +187,9 @@ def optimize_teacher_allocation(input_data):
         else:
             classroom['ratio'] = 0
     
+    # Add individual teacher allocations for all classrooms at once
+    teacher_allocation = allocate_teacher_students(teacher_blocks, subject_difficulties, max_students_per_teacher)
+    
     # Use the updated classroom allocations
     classroom_allocation = classroom_allocations
     
@@ -357,6 +248,238 @@ def optimize_teacher_allocation(input_data):
         'recommendations': recommendations
     }
 
+def split_classrooms_evenly(teachers_per_subject, students_per_subject, num_classrooms, max_size):
+    """
+    Spreads each subject's teachers evenly over the classrooms and its students
+    in proportion to them, without exceeding classroom capacity.
+    
+    Args:
+        teachers_per_subject: Dictionary mapping subjects to teacher counts
+        students_per_subject: Dictionary mapping subjects to student counts
+        num_classrooms: Number of classrooms
+        max_size: Capacity of each classroom
+    
+    Returns:
+        Tuple of dictionaries mapping subjects to per-classroom teacher and
+        student counts
+    """
+    # First pass: calculate how many teachers per classroom for each subject
+    # But distribute them more evenly to avoid all in classroom 1
+    teachers_per_classroom_subject = {}
+    for subject, count in teachers_per_subject.items():
+        # Distribute teachers evenly across all classrooms
+        if count == 0:
+            continue
+            
+        # Calculate base and extras
+        base_teachers = count // num_classrooms
+        extra_teachers = count % num_classrooms
+        
+        teachers_per_classroom_subject[subject] = []
+        
+        # Shuffle the extra teachers a bit to avoid front-loading
+        extra_classrooms = list(range(num_classrooms))
+        # Simple shuffle - put more teachers in middle classrooms
+        if num_classrooms > 3:
+            extra_classrooms = list(range(1, num_classrooms-1)) + [0, num_classrooms-1]
+        
+        for i in range(num_classrooms):
+            # Assign base teachers to each classroom
+            teacher_count = base_teachers
+            # Distribute extras more evenly (not just to first N)
+            if i < extra_teachers and i in extra_classrooms[:extra_teachers]:
+                teacher_count += 1
+            teachers_per_classroom_subject[subject].append(teacher_count)
+    
+    # Second pass: calculate how many students per classroom for each subject
+    # Use a more even distribution to avoid all in classroom 1
+    students_per_classroom_subject = {}
+    
+    # First, distribute evenly regardless of subject
+    classroom_capacities = np.full(num_classrooms, max_size)
+    
+    # Distribute by subject, but enforce classroom capacity
+    for subject, count in students_per_subject.items():
+        students_per_classroom_subject[subject] = allocate_subject_students(
+            count, teachers_per_classroom_subject.get(subject), classroom_capacities
+        )
+    
+    return teachers_per_classroom_subject, students_per_classroom_subject
+
+def allocate_subject_students(count, teacher_counts, classroom_capacities):
+    """
+    Distributes a subject's students over the classrooms without exceeding
+    their remaining capacity.
+    
+    Args:
+        count: Number of students taking the subject
+        teacher_counts: The subject's number of teachers in each classroom, or
+            None if it has no teacher allocations
+        classroom_capacities: Array of remaining classroom capacities, reduced
+            in place by the students assigned
+    
+    Returns:
+        List with the number of the subject's students in each classroom
+    """
+    num_classrooms = len(classroom_capacities)
+    
+    # If we have teacher allocations for this subject, use them
+    if teacher_counts is not None and sum(teacher_counts) > 0:
+        teacher_counts = np.asarray(teacher_counts, dtype=np.int64)
+        
+        # First round of allocation based on teacher proportion, respecting
+        # classroom capacity, for all classrooms at once. Classrooms are filled
+        # in order until the subject's students run out.
+        ideal_counts = np.rint((teacher_counts / teacher_counts.sum()) * count).astype(np.int64)
+        capped_counts = np.minimum(ideal_counts, classroom_capacities.astype(np.int64))
+        allocated_before = np.cumsum(capped_counts) - capped_counts
+        student_counts = np.minimum(capped_counts, np.maximum(count - allocated_before, 0))
+        
+        classroom_capacities -= student_counts
+        remaining_students = count - int(student_counts.sum())
+        
+        # Distribute any remaining students to classrooms with capacity
+        return fill_remaining_capacity(student_counts.tolist(), classroom_capacities, remaining_students)
+    
+    # If no teachers for this subject, distribute evenly across classrooms
+    students = [0] * num_classrooms
+    remaining_students = count
+    for i in range(num_classrooms):
+        if remaining_students <= 0:
+            break
+            
+        # Distribute evenly but respect capacity
+        even_share = remaining_students // (num_classrooms - i)
+        # Ensure we don't exceed classroom capacity
+        student_count = min(even_share, int(classroom_capacities[i]))
+        
+        students[i] = student_count
+        classroom_capacities[i] -= student_count
+        remaining_students -= student_count
+    
+    # Handle any remaining students
+    return fill_remaining_capacity(students, classroom_capacities, remaining_students)
+
+def fill_remaining_capacity(students, classroom_capacities, remaining_students):
+    """
+    Adds students to the classrooms in order, each taking as many as its
+    remaining capacity allows, until none are left.
+    
+    Args:
+        students: List with the number of students in each classroom
+        classroom_capacities: Array of remaining classroom capacities, reduced
+            in place by the students added
+        remaining_students: Number of students still to place
+    
+    Returns:
+        List with the updated number of students in each classroom
+    """
+    room = np.maximum(classroom_capacities, 0)
+    # Students still to place on reaching each classroom, subtracting the
+    # earlier classrooms' capacities one at a time
+    left = np.subtract.accumulate(np.concatenate(([remaining_students], room[:-1])))
+    extras = np.minimum(room, np.maximum(left, 0))
+    classroom_capacities -= extras
+    
+    # With fractional capacities, the first classroom keeps the integer count
+    # when it takes every remaining student without filling up
+    for n, i in enumerate(np.flatnonzero(extras).tolist()):
+        extra = extras[i].item()
+        if n == 0 and extra < room[i]:
+            extra = remaining_students
+        students[i] += extra
+    
+    return students
+
+def allocate_teacher_students(teacher_blocks, subject_difficulties, max_students_per_teacher):
+    """
+    Splits the students of each subject in each classroom among its teachers,
+    computing every teacher's share in one pass over parallel arrays.
+    
+    Args:
+        teacher_blocks: List of (subject, classroom index, teachers, students)
+            tuples in allocation order
+        subject_difficulties: Dictionary mapping subjects to difficulty levels
+        max_students_per_teacher: Maximum number of students per teacher
+    
+    Returns:
+        List of teacher allocation dictionaries, one per teacher
+    """
+    if not teacher_blocks:
+        return []
+    
+    subjects, classrooms, teachers, students = zip(*teacher_blocks)
+    teachers = np.array(teachers, dtype=np.int64)
+    # Students can be fractional when classroom capacities are
+    fractional = np.array([isinstance(count, float) for count in students])
+    students = np.array(students, dtype=np.float64)
+    
+    # Distribute students more evenly among teachers: every teacher gets the
+    # base number of students and the first teachers of a block one extra
+    with np.errstate(divide='ignore', invalid='ignore'):
+        base_students_per_teacher = students // teachers
+        extra_students = students % teachers
+    
+    # Adjust based on subject difficulty - harder subjects get fewer students.
+    # A block's teachers only have two possible shares, so adjust both once per
+    # block rather than once per teacher
+    difficulties = np.array([subject_difficulties.get(subject, 5) for subject in subjects], dtype=np.float64)
+    difficulty_factors = np.clip((10 - difficulties) / 5, 0.7, 1.3)
+    with np.errstate(invalid='ignore'):
+        base_adjusted, base_as_float = adjust_teacher_share(base_students_per_teacher, difficulty_factors, fractional)
+        extra_adjusted, extra_as_float = adjust_teacher_share(base_students_per_teacher + 1, difficulty_factors, fractional)
+    
+    # The first teachers of a block, up to its leftover students, take the extra share
+    extra_teachers = np.ceil(np.nan_to_num(extra_students)).astype(np.int64)
+    base_teachers = teachers - extra_teachers
+    
+    if max_students_per_teacher > 0:
+        base_utilization = ((base_adjusted / max_students_per_teacher) * 100).tolist()
+        extra_utilization = ((extra_adjusted / max_students_per_teacher) * 100).tolist()
+    else:
+        base_utilization = extra_utilization = [0] * len(teachers)
+    
+    # Build each block's teacher records once per share and copy them per teacher
+    teacher_allocation = []
+    for b, (subject, classroom) in enumerate(zip(subjects, classrooms)):
+        classroom_name = f"Classroom {classroom + 1}"
+        for count, adjusted, as_float, utilization in (
+            (extra_teachers[b], extra_adjusted[b], extra_as_float[b], extra_utilization[b]),
+            (base_teachers[b], base_adjusted[b], base_as_float[b], base_utilization[b])
+        ):
+            if count == 0:
+                continue
+            record = {
+                'subject': subject,
+                'students_assigned': adjusted.item() if as_float else int(adjusted),
+                'classroom': classroom_name,
+                'utilization': utilization
+            }
+            teacher_allocation.extend(record.copy() for _ in range(count))
+    
+    return teacher_allocation
+
+def adjust_teacher_share(share, difficulty_factors, fractional):
+    """
+    Scales each block's per-teacher share of students by its subject's
+    difficulty factor.
+    
+    Args:
+        share: Array with the number of students per teacher in each block
+        difficulty_factors: Array with each block's difficulty factor
+        fractional: Boolean array marking blocks with fractional student counts
+    
+    Returns:
+        Tuple of the adjusted shares and a boolean array marking the shares
+        that must stay fractional
+    """
+    rounded = np.maximum(1, np.rint(share * difficulty_factors))
+    
+    # Ensure we don't exceed our target total by more than two students either way
+    adjusted = np.maximum(np.minimum(rounded, share + 2), share - 2)
+    # Counts stay integers unless clamped to a fractional block's share
+    return adjusted, fractional & (adjusted != rounded)
+
 def generate_recommendations(input_data, optimal_ratio, teacher_allocation, classroom_allocation, subject_allocation):
     """
     Generate simple, actionable recommendations based on optimization results.
@@ -420,9 +543,13 @@ def generate_recommendations(input_data, optimal_ratio, teacher_allocation, clas
     
     # Recommendation 3: Classroom balancing
     if len(classroom_allocation) > 1:
-        # Check if classrooms are imbalanced
-        min_ratio = min(classroom['ratio'] for classroom in classroom_allocation if classroom['ratio'] > 0)
-        max_ratio = max(classroom['ratio'] for classroom in classroom_allocation if classroom['ratio'] > 0)
+        # Check if classrooms are imbalanced, among classrooms with a ratio
+        classroom_ratios = np.fromiter(
+            (classroom['ratio'] for classroom in classroom_allocation), dtype=np.float64, count=len(classroom_allocation)
+        )
+        classroom_ratios = classroom_ratios[classroom_ratios > 0]
+        min_ratio = classroom_ratios.min() if classroom_ratios.size else 0
+        max_ratio = classroom_ratios.max() if classroom_ratios.size else 0
         
         if max_ratio - min_ratio > 3:
             classroom_recommendations = [
@@ -445,8 +572,10 @@ def generate_recommendations(input_data, optimal_ratio, teacher_allocation, clas
             })
     
     # Recommendation 4: Teacher utilization
-    teacher_utilization = [t['utilization'] for t in teacher_allocation]
-    avg_utilization = sum(teacher_utilization) / len(teacher_utilization) if teacher_utilization else 0
+    teacher_utilization = np.fromiter(
+        (t['utilization'] for t in teacher_allocation), dtype=np.float64, count=len(teacher_allocation)
+    )
+    avg_utilization = teacher_utilization.mean() if teacher_utilization.size else 0
     
     if avg_utilization < 80:
         recommendations.append({
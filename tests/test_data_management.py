@@ -0,0 +1,64 @@
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import data_management
+
+
+class DumpJsonTest(unittest.TestCase):
+    """Scenario JSON is written the same way with and without orjson"""
+    
+    SCENARIO = {
+        'name': 'School',
+        'ratio': float('nan'),
+        'limit': float('inf'),
+        1: 'int key',
+        None: 'none key',
+        'counts': np.array([1, 2, 3]),
+        'mean': np.float64(12.5),
+        'total': np.int64(40),
+        'subjects': ('Math', 'Música'),
+    }
+    
+    EXPECTED = {
+        'name': 'School',
+        'ratio': None,
+        'limit': None,
+        '1': 'int key',
+        'null': 'none key',
+        'counts': [1, 2, 3],
+        'mean': 12.5,
+        'total': 40,
+        'subjects': ['Math', 'Música'],
+    }
+    
+    def dump_with_json(self, obj, indent=False):
+        with mock.patch.object(data_management, 'orjson', None):
+            return data_management._dump_json(obj, indent=indent)
+    
+    def test_json_fallback(self):
+        for indent in (False, True):
+            raw = self.dump_with_json(self.SCENARIO, indent=indent)
+            self.assertEqual(json.loads(raw), self.EXPECTED)
+    
+    @unittest.skipIf(data_management.orjson is None, "orjson is not installed")
+    def test_orjson_matches_json_fallback(self):
+        for indent in (False, True):
+            raw = data_management._dump_json(self.SCENARIO, indent=indent)
+            self.assertEqual(json.loads(raw), self.EXPECTED)
+            self.assertEqual(raw, self.dump_with_json(self.SCENARIO, indent=indent))
+    
+    def test_written_json_is_strict(self):
+        # NaN and Infinity are not valid JSON, so orjson could not read them back
+        raw = self.dump_with_json({'ratio': float('nan')})
+        self.assertEqual(data_management._load_json(raw), {'ratio': None})
+    
+    def test_unsupported_key_raises(self):
+        with self.assertRaises(TypeError):
+            self.dump_with_json({(1, 2): 'tuple key'})
+
+
+if __name__ == '__main__':
+    unittest.main()